@@ -0,0 +1,138 @@
+"""
+Async data-access layer for the backend (asyncpg).
+
+One connection pool per process, sized explicitly via DB_POOL_MIN / DB_POOL_MAX.
+Queries run through asyncpg's per-connection statement cache, so each hot query
+below is prepared once per pooled connection and then only bound and executed.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+from cache import TTLCache
+
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "5"))
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+# Hot statements (kept as constants so the cache key is stable)
+# normalize_phone() matches the unique expression index in schema.sql
+SELECT_USER_BY_PHONE = "SELECT * FROM users WHERE normalize_phone(phone) = $1"
+INSERT_USER = """
+    INSERT INTO users (firstName, lastName, phone, customerEmail, location, storeName, latitude, longitude)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    ON CONFLICT ((normalize_phone(phone))) DO NOTHING
+    RETURNING id
+"""
+USER_COLUMNS = ["firstName", "lastName", "phone", "customerEmail", "location", "storeName", "latitude", "longitude"]
+
+class DatabaseUnavailable(Exception):
+    """The pool is not connected yet (Postgres down or still starting)."""
+
+def normalize_phone(phone):
+    """Python twin of the normalize_phone() SQL function, used as the cache key."""
+    digits = "".join(ch for ch in str(phone) if "0" <= ch <= "9")
+    if digits.startswith("0"):
+        return "62" + digits[1:]
+    if digits.startswith("8"):
+        return "62" + digits
+    return digits
+
+def asyncpg_dsn(url):
+    """Strip a SQLAlchemy driver suffix (postgresql+psycopg2://) so asyncpg accepts the URL."""
+    scheme, sep, rest = (url or "").partition("://")
+    return scheme.split("+")[0] + sep + rest
+
+class Database:
+    def __init__(self, dsn, min_size=POOL_MIN, max_size=POOL_MAX, acquire_timeout=ACQUIRE_TIMEOUT):
+        self.dsn = asyncpg_dsn(dsn)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.pool = None
+        self.acquired = 0
+        self.acquire_timeouts = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+        # Existing users only: a miss always goes to the database, so a user
+        # inserted by another process is never hidden by a cached "not found"
+        self.user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+    async def connect(self):
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=STATEMENT_CACHE_SIZE,
+            max_inactive_connection_lifetime=300
+        )
+        print(f"Database pool ready (min={self.min_size}, max={self.max_size})")
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @asynccontextmanager
+    async def connection(self):
+        """Acquire a pooled connection, recording how long the caller waited."""
+        if self.pool is None:
+            raise DatabaseUnavailable("database is not connected yet")
+        start = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.acquire_timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        self.acquired += 1
+        self.acquire_wait_total += waited
+        self.acquire_wait_max = max(self.acquire_wait_max, waited)
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+
+    def stats(self):
+        size = self.pool.get_size() if self.pool else 0
+        idle = self.pool.get_idle_size() if self.pool else 0
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "acquired": self.acquired,
+            "acquire_timeouts": self.acquire_timeouts,
+            "acquire_wait_avg_ms": round(1000 * self.acquire_wait_total / self.acquired, 3) if self.acquired else 0.0,
+            "acquire_wait_max_ms": round(1000 * self.acquire_wait_max, 3),
+            "user_cache": self.user_cache.stats()
+        }
+
+    async def get_user_by_phone(self, phone):
+        key = normalize_phone(phone)
+        user = self.user_cache.get(key)
+        if user is not None:
+            return user
+
+        async with self.connection() as conn:
+            row = await conn.fetchrow(SELECT_USER_BY_PHONE, key)
+        if row is None:
+            return None
+        user = dict(row)
+        self.user_cache.set(key, user)
+        return user
+
+    async def insert_user(self, user):
+        """Insert a user; returns the new id, or None if the phone is already registered."""
+        key = normalize_phone(user.get("phone"))
+        async with self.connection() as conn:
+            user_id = await conn.fetchval(INSERT_USER, *[user.get(c) for c in USER_COLUMNS])
+        self.user_cache.invalidate(key)
+        return user_id
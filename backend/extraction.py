@@ -0,0 +1,199 @@
+"""
+Gemini extraction of notes / receipt photos, cached by image content.
+
+Each image is keyed by the SHA-256 of its bytes and also fingerprinted with a
+64-bit difference hash (dHash). A resend of the same photo hits the exact key.
+Results live in extraction_cache (shared by all workers, bounded by
+EXTRACTION_CACHE_TTL_DAYS and EXTRACTION_CACHE_MAX_ROWS) with a small
+in-process LRU in front.
+
+A re-compressed or resized copy (WhatsApp forwards) lands within a few bits of
+the original dHash, but so do receipts printed from the same template with
+different amounts. Near matches are therefore off unless PHASH_MAX_DISTANCE is
+set, and even then only reuse results from the same scope (the chat or user
+that sent the image), comparing against its EXTRACTION_SIMILAR_SCAN newest rows.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+
+from PIL import Image, UnidentifiedImageError
+
+from cache import TTLCache
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+EXTRACTION_CACHE_TTL_DAYS = int(os.getenv("EXTRACTION_CACHE_TTL_DAYS", "30"))
+EXTRACTION_CACHE_MAX_ROWS = int(os.getenv("EXTRACTION_CACHE_MAX_ROWS", "50000"))
+# Max differing dHash bits for two images of one scope to count as the same photo; 0 = exact only
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "0"))
+EXTRACTION_SIMILAR_SCAN = int(os.getenv("EXTRACTION_SIMILAR_SCAN", "200"))
+PRUNE_EVERY = 100
+
+# Bump when the prompt or output shape changes; older cache rows stop matching
+EXTRACTION_VERSION = 1
+EXTRACTION_PROMPT = """
+Gambar ini adalah catatan keuangan atau struk dari mitra UMKM.
+Ekstrak isinya sebagai JSON dengan field:
+  document_type: "receipt" | "ledger" | "screenshot" | "other"
+  date: tanggal transaksi (YYYY-MM-DD) atau null
+  income: total pendapatan (angka, Rupiah) atau 0
+  expense: total pengeluaran (angka, Rupiah) atau 0
+  cashflow: income - expense
+  items: daftar {"description": str, "amount": number, "type": "income" | "expense"}
+  summary: ringkasan singkat dalam Bahasa Indonesia
+"""
+
+SELECT_EXACT = """
+    UPDATE extraction_cache SET hits = hits + 1, last_hit_at = now()
+    WHERE content_hash = $1 AND version = $2 AND created_at > now() - make_interval(days => $3)
+    RETURNING result
+"""
+
+SELECT_SIMILAR = """
+    WITH recent AS (
+        SELECT content_hash, phash
+        FROM extraction_cache
+        WHERE scope = $5 AND version = $2 AND created_at > now() - make_interval(days => $3)
+        ORDER BY created_at DESC
+        LIMIT $6
+    ), nearest AS (
+        SELECT content_hash, bit_count((phash # $1)::bit(64)) AS distance
+        FROM recent
+        ORDER BY distance
+        LIMIT 1
+    )
+    UPDATE extraction_cache c SET hits = hits + 1, last_hit_at = now()
+    FROM nearest n
+    WHERE c.content_hash = n.content_hash AND n.distance <= $4
+    RETURNING c.result
+"""
+
+INSERT_RESULT = """
+    INSERT INTO extraction_cache (content_hash, phash, version, result, scope)
+    VALUES ($1, $2, $3, $4::jsonb, $5)
+    ON CONFLICT (content_hash) DO UPDATE
+    SET phash = EXCLUDED.phash, version = EXCLUDED.version, result = EXCLUDED.result, scope = EXCLUDED.scope,
+        created_at = now(), last_hit_at = now()
+"""
+
+PRUNE_EXPIRED = "DELETE FROM extraction_cache WHERE created_at < now() - make_interval(days => $1)"
+PRUNE_OVERFLOW = """
+    DELETE FROM extraction_cache WHERE content_hash IN (
+        SELECT content_hash FROM extraction_cache ORDER BY last_hit_at DESC OFFSET $1)
+"""
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def dhash(data, size=8):
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 grayscale thumbnail."""
+    try:
+        image = Image.open(io.BytesIO(data)).convert("L").resize((size + 1, size), Image.LANCZOS)
+    except UnidentifiedImageError:
+        raise ValueError("file is not a supported image")
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    # Store as signed BIGINT
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def gemini_extract(data, mime_type, api_key):
+    """Blocking Gemini call; returns the parsed JSON extraction."""
+    import google.generativeai as genai
+
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(GEMINI_MODEL)
+    response = model.generate_content(
+        [EXTRACTION_PROMPT, {"mime_type": mime_type, "data": data}],
+        generation_config={"response_mime_type": "application/json"}
+    )
+    return json.loads(response.text)
+
+class ExtractionService:
+    def __init__(self, db, key_pool, extract=gemini_extract):
+        self.db = db
+        self.key_pool = key_pool
+        self.extract = extract
+        self.memory = TTLCache(1000, EXTRACTION_CACHE_TTL_DAYS * 86400)
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.gemini_calls = 0
+        self._stores = 0
+        self._inflight = {}
+
+    async def extract_image(self, data, mime_type="image/jpeg", scope=None):
+        """
+        Return (result, source) where source is 'memory', 'exact', 'similar' or 'gemini'.
+        scope (chat or user id) enables near matches among that scope's own images.
+        """
+        key = content_hash(data)
+        result = self.memory.get(key)
+        if result is not None:
+            self.exact_hits += 1
+            return result, "memory"
+
+        # Identical images arriving together share one Gemini call
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            outcome = await self._lookup_or_extract(key, data, mime_type, scope)
+            future.set_result(outcome)
+            return outcome
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be awaiting it; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _lookup_or_extract(self, key, data, mime_type, scope):
+        async with self.db.connection() as conn:
+            row = await conn.fetchval(SELECT_EXACT, key, EXTRACTION_VERSION, EXTRACTION_CACHE_TTL_DAYS)
+        if row is not None:
+            self.exact_hits += 1
+            result = json.loads(row)
+            self.memory.set(key, result)
+            return result, "exact"
+
+        phash = await asyncio.to_thread(dhash, data)
+        if scope is not None and PHASH_MAX_DISTANCE > 0:
+            async with self.db.connection() as conn:
+                row = await conn.fetchval(SELECT_SIMILAR, phash, EXTRACTION_VERSION, EXTRACTION_CACHE_TTL_DAYS,
+                                          PHASH_MAX_DISTANCE, scope, EXTRACTION_SIMILAR_SCAN)
+            if row is not None:
+                # Not memoized: the in-process cache is shared by every scope
+                self.similar_hits += 1
+                return json.loads(row), "similar"
+
+        self.gemini_calls += 1
+        async with self.key_pool.lease() as gemini_key:
+            result = await asyncio.to_thread(self.extract, data, mime_type, gemini_key.key)
+        await self._store(key, phash, result, scope)
+        self.memory.set(key, result)
+        return result, "gemini"
+
+    async def _store(self, key, phash, result, scope):
+        async with self.db.connection() as conn:
+            await conn.execute(INSERT_RESULT, key, phash, EXTRACTION_VERSION, json.dumps(result), scope)
+            self._stores += 1
+            if self._stores % PRUNE_EVERY == 0:
+                await conn.execute(PRUNE_EXPIRED, EXTRACTION_CACHE_TTL_DAYS)
+                await conn.execute(PRUNE_OVERFLOW, EXTRACTION_CACHE_MAX_ROWS)
+
+    def stats(self):
+        return {
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "gemini_calls": self.gemini_calls,
+            "memory": self.memory.stats()
+        }
@@ -0,0 +1,209 @@
+"""
+Gemini API key pool.
+
+Every key gets a token bucket sized to its quota (GEMINI_KEY_RPM, GEMINI_KEY_BURST).
+acquire() hands out the least-loaded key that has a token: most spare tokens,
+then fewest requests in flight. A key that returns 429 cools down, for the
+Retry-After if given, else with exponential backoff. A key that fails auth is
+parked for an hour. Callers wait for the next free key instead of cycling
+through keys that are known to be exhausted.
+
+The backend uses KeyPool.lease(); the n8n "Pick Gemini Key" and "Release Gemini
+Key" nodes use the same pool through /api/gemini/keys/acquire and /release,
+authenticated with GEMINI_POOL_TOKEN (see main.py).
+
+The buckets live in this process's memory, so the backend must run as a single
+worker process: every extra uvicorn/gunicorn worker would hand out each key's
+full quota again.
+"""
+import asyncio
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+GEMINI_KEY_RPM = float(os.getenv("GEMINI_KEY_RPM", "10"))
+GEMINI_KEY_BURST = float(os.getenv("GEMINI_KEY_BURST", "3"))
+GEMINI_KEY_COOLDOWN = float(os.getenv("GEMINI_KEY_COOLDOWN", "30"))
+GEMINI_KEY_MAX_COOLDOWN = float(os.getenv("GEMINI_KEY_MAX_COOLDOWN", "300"))
+INVALID_KEY_COOLDOWN = 3600
+# A lease nobody released (e.g. the workflow succeeded and moved on) stops counting as in flight
+LEASE_TTL = 120
+
+class NoKeyAvailable(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"no Gemini key available, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class RateLimited(Exception):
+    """Raised by callers of lease() to report a 429 from Gemini."""
+    def __init__(self, message="rate limited", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def load_keys():
+    """GEMINI_API_KEYS="name1=key1,name2=key2" (names optional), falling back to GEMINI_API_KEY."""
+    raw = os.getenv("GEMINI_API_KEYS") or os.getenv("GEMINI_API_KEY") or ""
+    keys = []
+    for i, entry in enumerate(e.strip() for e in raw.split(",")):
+        if not entry:
+            continue
+        name, sep, key = entry.partition("=")
+        keys.append((name, key) if sep else (f"key-{i}", entry))
+    return keys
+
+def is_rate_limit_error(e):
+    text = str(e).lower()
+    return type(e).__name__ == "ResourceExhausted" or "429" in text or "too many requests" in text
+
+def is_invalid_key_error(e):
+    text = str(e).lower()
+    return type(e).__name__ == "PermissionDenied" or "api key not valid" in text or "check your credentials" in text
+
+class GeminiKey:
+    def __init__(self, key_id, name, key, rpm=GEMINI_KEY_RPM, burst=GEMINI_KEY_BURST):
+        self.key_id = key_id
+        self.name = name
+        self.key = key
+        self.rate = rpm / 60.0
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.strikes = 0
+        self.leases = 0
+        self.rate_limited = 0
+        self.errors = 0
+
+    def refill(self, now):
+        # updated can lie in the future while the key cools down
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def ready_in(self, now):
+        """Seconds until this key can take a request."""
+        token_wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(self.cooldown_until - now, token_wait, 0.0)
+
+class KeyPool:
+    def __init__(self, keys=None, rpm=GEMINI_KEY_RPM, burst=GEMINI_KEY_BURST):
+        keys = load_keys() if keys is None else keys
+        self.keys = [GeminiKey(i, name, key, rpm, burst) for i, (name, key) in enumerate(keys)]
+        self.leases = {}
+        self.waits = 0
+        self.rejections = 0
+
+    def _expire_leases(self, now):
+        for lease_id, (key, started) in list(self.leases.items()):
+            if now - started > LEASE_TTL:
+                del self.leases[lease_id]
+                key.in_flight = max(key.in_flight - 1, 0)
+
+    def try_acquire(self):
+        """Take a token from the least-loaded ready key; returns (lease_id, key) or raises NoKeyAvailable."""
+        if not self.keys:
+            raise NoKeyAvailable(INVALID_KEY_COOLDOWN)
+
+        now = time.monotonic()
+        self._expire_leases(now)
+        for key in self.keys:
+            key.refill(now)
+        ready = [k for k in self.keys if k.cooldown_until <= now and k.tokens >= 1]
+        if not ready:
+            raise NoKeyAvailable(min(k.ready_in(now) for k in self.keys))
+
+        key = max(ready, key=lambda k: (k.tokens - k.in_flight, -k.in_flight))
+        key.tokens -= 1
+        key.in_flight += 1
+        key.leases += 1
+        lease_id = uuid.uuid4().hex
+        self.leases[lease_id] = (key, now)
+        return lease_id, key
+
+    async def acquire(self, timeout=10.0):
+        """Like try_acquire, but waits up to timeout seconds for a key to free up."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.try_acquire()
+            except NoKeyAvailable as e:
+                remaining = deadline - time.monotonic()
+                if e.retry_after > remaining:
+                    self.rejections += 1
+                    raise
+                self.waits += 1
+                await asyncio.sleep(e.retry_after)
+
+    def release(self, lease_id, status="ok", retry_after=None):
+        """
+        Report the outcome of a leased call: 'ok', 'rate_limited' (429),
+        'invalid' (bad key) or 'error' (anything else). Unknown leases are ignored.
+        """
+        entry = self.leases.pop(lease_id, None)
+        if entry is None:
+            return False
+        key, _ = entry
+        key.in_flight = max(key.in_flight - 1, 0)
+        now = time.monotonic()
+
+        if status == "ok":
+            key.strikes = 0
+        elif status == "rate_limited":
+            key.rate_limited += 1
+            key.strikes += 1
+            backoff = min(GEMINI_KEY_COOLDOWN * 2 ** (key.strikes - 1), GEMINI_KEY_MAX_COOLDOWN)
+            key.cooldown_until = now + (retry_after if retry_after else backoff)
+            # Quota is gone for now; don't let the bucket pretend otherwise after cooldown
+            key.tokens = 0
+            key.updated = key.cooldown_until
+        elif status == "invalid":
+            key.errors += 1
+            key.cooldown_until = now + INVALID_KEY_COOLDOWN
+        else:
+            key.errors += 1
+        return True
+
+    @asynccontextmanager
+    async def lease(self, timeout=10.0):
+        """async with pool.lease() as key: ... releases with the right status on exit."""
+        lease_id, key = await self.acquire(timeout)
+        try:
+            yield key
+        except RateLimited as e:
+            self.release(lease_id, "rate_limited", e.retry_after)
+            raise
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self.release(lease_id, "rate_limited")
+            elif is_invalid_key_error(e):
+                self.release(lease_id, "invalid")
+            else:
+                self.release(lease_id, "error")
+            raise
+        else:
+            self.release(lease_id, "ok")
+
+    def stats(self):
+        now = time.monotonic()
+        keys = []
+        for k in self.keys:
+            k.refill(now)
+            keys.append({
+                "key_id": k.key_id,
+                "name": k.name,
+                "tokens": round(max(k.tokens, 0), 2),
+                "in_flight": k.in_flight,
+                "cooldown_seconds": round(max(k.cooldown_until - now, 0), 1),
+                "leases": k.leases,
+                "rate_limited": k.rate_limited,
+                "errors": k.errors
+            })
+        return {
+            "keys": keys,
+            "rpm_per_key": self.keys[0].rate * 60 if self.keys else 0,
+            "active_leases": len(self.leases),
+            "waits": self.waits,
+            "rejections": self.rejections
+        }
@@ -1,39 +1,51 @@
+import argparse
 import os
 import time
 from sqlalchemy import create_engine, text
 
 from dotenv import load_dotenv
 
+from migrate import migrate
+
 load_dotenv()
 
 # Get DB URL from env or use default
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-def init_db():
+def reset_db():
+    """Drop every table (and all data); only for throwaway databases."""
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Dropping existing tables...")
+        conn.execute(text("DROP TABLE IF EXISTS schema_version, extraction_cache, webhook_dedupe, webhook_events, customer_features, msme_profiles, agent_logs, agent_tasks, notifications, task_participants, tasks, bills, loans, customers, users, agents, workflows CASCADE;"))
+        conn.commit()
+    engine.dispose()
+
+def init_db(reset=False):
+    """
+    Bring the schema up to date in place via migrate.py; data is kept.
+    With reset=True the tables are dropped first and rebuilt from schema.sql.
+    """
     print(f"Connecting to {DATABASE_URL}...")
     try:
-        engine = create_engine(DATABASE_URL)
-        with engine.connect() as conn:
-            # Drop tables to ensure schema is enforced
-            print("Dropping existing tables...")
-            conn.execute(text("DROP TABLE IF EXISTS msme_profiles, agent_logs, agent_tasks, notifications, task_participants, tasks, bills, loans, customers, users, agents, workflows CASCADE;"))
-            conn.commit()
-            
-            print("Creating tables from schema.sql...")
-            with open("backend/schema.sql", "r") as f:
-                schema = f.read()
-                conn.execute(text(schema))
-                conn.commit()
+        if reset:
+            reset_db()
+        migrate(DATABASE_URL)
         print("Database initialized successfully.")
     except Exception as e:
         print(f"Error initializing database: {e}")
         raise e
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or migrate the ArthiUsaha database schema.")
+    parser.add_argument("--reset", action="store_true",
+                        help="DROP all tables and data first (the old behaviour); default only applies pending migrations")
+    args = parser.parse_args()
+
     # Retry logic in case DB is starting up
     for i in range(5):
         try:
-            init_db()
+            init_db(reset=args.reset)
             break
         except Exception as e:
             print(f"Retrying in 2 seconds... Error: {e}")
@@ -1,7 +1,10 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, UploadFile, File, Form, Header, Query
+import asyncio
+import hmac
+import math
 import os
 import pandas as pd
-from sqlalchemy import create_engine
+from fastapi.responses import JSONResponse
 
 from dotenv import load_dotenv
 
@@ -11,35 +14,87 @@ app = FastAPI(title="ArthiUsaha Backend")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Shared secret the n8n nodes send to lease keys; the pool endpoints refuse all callers while unset
+GEMINI_POOL_TOKEN = os.getenv("GEMINI_POOL_TOKEN")
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to ArthiUsaha Backend"}
 
+async def handle_webhook_event(data):
+    """
+    Process one queued WAHA event (runs on a webhook_queue worker, not in the request).
+    """
+    print("Received Webhook:", data.get("event"), (data.get("payload") or {}).get("id"))
+    # Logic to process message, call Gemini, update Tier, etc.
+
 @app.post("/webhook")
 async def waha_webhook(request: Request):
     """
     Endpoint to receive messages from WAHA (WhatsApp).
+    Persists the event and returns immediately; workers process it in the background.
     """
-    data = await request.json()
-    print("Received Webhook:", data)
-    # Logic to process message, call Gemini, update Tier, etc.
-    return {"status": "received"}
+    try:
+        data = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "invalid JSON"}, status_code=400)
+
+    try:
+        event_id = await webhook_queue.enqueue(data)
+    except QueueFull as e:
+        # WAHA retries failed deliveries, so shedding here loses nothing
+        return JSONResponse({"error": str(e)}, status_code=503)
+    if event_id is None:
+        # Already accepted once; 200 so WAHA stops retrying
+        return {"status": "duplicate"}
+    return {"status": "queued", "id": event_id}
+
+@app.get("/webhook/metrics")
+async def webhook_metrics():
+    """Queue depth, lag and worker counters."""
+    return await webhook_queue.metrics()
+
+async def connect_database():
+    """
+    Open the pool and start the webhook queue, retrying with backoff until Postgres
+    is up and migrated. Until then DB routes answer 503 and the rest keep serving.
+    """
+    delay = 1
+    while True:
+        try:
+            if db.pool is None:
+                await db.connect()
+            await webhook_queue.start()
+            return
+        except Exception as e:
+            print(f"Database not ready ({e}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     """
     Initialize DB and load initial data if needed.
     """
     print("Starting ArthiUsaha Backend...")
+    app.state.db_ready = asyncio.create_task(connect_database())
     # TODO: Add logic to load CSVs from /app/data into Postgres
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.db_ready.cancel()
+    await webhook_queue.stop()
+    await db.close()
+
 # --- User Onboarding API ---
 
 from pydantic import BaseModel
 from typing import Optional
-from sqlalchemy import text
 from datetime import datetime
+from db import Database, DatabaseUnavailable
+from webhook_queue import WebhookQueue, QueueFull
+from extraction import ExtractionService
+from gemini_keys import KeyPool, NoKeyAvailable
 
 class UserCreate(BaseModel):
     firstName: str
@@ -51,70 +106,151 @@ class UserCreate(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
 
-# Create engine
-engine = create_engine(DATABASE_URL)
+# Async connection pool, opened on startup (see db.py)
+db = Database(DATABASE_URL)
+webhook_queue = WebhookQueue(db, handle_webhook_event)
+gemini_keys = KeyPool()
+extraction = ExtractionService(db, gemini_keys)
+
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable(request: Request, e: DatabaseUnavailable):
+    # WAHA and other callers retry on 503
+    return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": "5"})
 
 @app.post("/api/users")
-def create_user(user: UserCreate):
+async def create_user(user: UserCreate):
     """Create a new user or return existing user."""
     try:
-        with engine.connect() as conn:
-            # Check if user exists
-            result = conn.execute(
-                text("SELECT * FROM users WHERE phone = :phone"),
-                {"phone": user.phone}
-            ).fetchone()
-            
-            if result:
-                # Convert row to dict
-                user_dict = result._mapping
-                # Handle datetime serialization if needed (FastAPI handles it usually, but let's be safe)
-                return {
-                    "message": "user_exists",
-                    "data": user_dict
-                }
-
-            # Insert new user
-            result = conn.execute(
-                text("""
-                    INSERT INTO users (firstName, lastName, phone, customerEmail, location, storeName, latitude, longitude)
-                    VALUES (:firstName, :lastName, :phone, :customerEmail, :location, :storeName, :latitude, :longitude)
-                    RETURNING id
-                """),
-                user.dict()
-            )
-            user_id = result.fetchone()[0]
-            conn.commit()
-            
+        # Check if user exists
+        existing = await db.get_user_by_phone(user.phone)
+        if existing:
             return {
-                "message": "success",
-                "data": user.dict(),
-                "id": user_id
+                "message": "user_exists",
+                "data": existing
             }
+
+        # Insert new user; a concurrent request for the same phone loses on the unique index
+        user_id = await db.insert_user(user.dict())
+        if user_id is None:
+            return {
+                "message": "user_exists",
+                "data": await db.get_user_by_phone(user.phone)
+            }
+
+        return {
+            "message": "success",
+            "data": user.dict(),
+            "id": user_id
+        }
             
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"Error creating user: {e}")
-        return {"error": str(e)}, 500
+        return JSONResponse({"error": str(e)}, status_code=500)
 
 @app.get("/api/users/check/{phone}")
-def check_user(phone: str):
+async def check_user(phone: str):
     """Check if a phone number already exists."""
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("SELECT * FROM users WHERE phone = :phone"),
-                {"phone": phone}
-            ).fetchone()
-            
-            if result:
-                return {
-                    "exists": True,
-                    "data": result._mapping
-                }
+        existing = await db.get_user_by_phone(phone)
+        if existing:
+            return {
+                "exists": True,
+                "data": existing
+            }
             
-            return {"exists": False}
+        return {"exists": False}
             
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"Error checking user: {e}")
-        return {"error": str(e)}, 500
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+@app.get("/api/db/pool")
+async def db_pool_stats():
+    """Connection pool size, utilisation and acquire wait times."""
+    return db.stats()
+
+# --- Media Extraction API ---
+
+def key_unavailable_response(e):
+    """429 telling the caller when the next Gemini key frees up."""
+    return JSONResponse({"error": str(e), "retry_after": round(e.retry_after, 1)}, status_code=429,
+                        headers={"Retry-After": str(max(math.ceil(e.retry_after), 1))})
+
+@app.post("/api/extract/image")
+async def extract_image(file: UploadFile = File(...), chat_id: Optional[str] = Form(None)):
+    """
+    Extract financial data from a note / receipt photo with Gemini.
+    Repeated copies of an image are answered from the cache; re-compressed copies
+    only among the images of the same chat_id, and only with PHASH_MAX_DISTANCE set.
+    """
+    try:
+        data = await file.read()
+        if not data:
+            return JSONResponse({"error": "empty file"}, status_code=400)
+        result, source = await extraction.extract_image(data, file.content_type or "image/jpeg", chat_id)
+        return {
+            "cached": source != "gemini",
+            "source": source,
+            "data": result
+        }
+
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except NoKeyAvailable as e:
+        return key_unavailable_response(e)
+    except DatabaseUnavailable:
+        raise
+    except Exception as e:
+        print(f"Error extracting image: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+@app.get("/api/extract/stats")
+async def extract_stats():
+    """Cache hit counters for /api/extract/image."""
+    return extraction.stats()
+
+# --- Gemini Key Pool API (used by the n8n "Pick Gemini Key" nodes) ---
+
+class KeyRelease(BaseModel):
+    lease_id: str
+    status: str = "ok"  # 'ok', 'rate_limited', 'invalid', 'error'
+    retry_after: Optional[float] = None
+
+def pool_auth_error(authorization):
+    """None when the request carries `Authorization: Bearer <GEMINI_POOL_TOKEN>`, else the error response."""
+    if not GEMINI_POOL_TOKEN:
+        return JSONResponse({"error": "GEMINI_POOL_TOKEN is not set"}, status_code=503)
+    expected = f"Bearer {GEMINI_POOL_TOKEN}".encode()
+    if not hmac.compare_digest((authorization or "").encode(), expected):
+        return JSONResponse({"error": "invalid or missing pool token"}, status_code=401,
+                            headers={"WWW-Authenticate": "Bearer"})
+    return None
+
+@app.post("/api/gemini/keys/acquire")
+async def acquire_gemini_key(wait: float = Query(10.0, ge=0, le=60), authorization: Optional[str] = Header(None)):
+    """Lease the least-loaded Gemini key, waiting up to `wait` seconds (at most 60) for one to free up."""
+    error = pool_auth_error(authorization)
+    if error:
+        return error
+    try:
+        lease_id, key = await gemini_keys.acquire(timeout=wait)
+    except NoKeyAvailable as e:
+        return key_unavailable_response(e)
+    return {"lease_id": lease_id, "key_id": key.key_id, "name": key.name, "key": key.key}
+
+@app.post("/api/gemini/keys/release")
+async def release_gemini_key(body: KeyRelease, authorization: Optional[str] = Header(None)):
+    """Report how the leased call went; a 429 puts the key into cooldown."""
+    error = pool_auth_error(authorization)
+    if error:
+        return error
+    return {"released": gemini_keys.release(body.lease_id, body.status, body.retry_after)}
 
+@app.get("/api/gemini/keys/stats")
+async def gemini_key_stats():
+    """Tokens, in-flight calls and cooldown per key (keys themselves are not shown)."""
+    return gemini_keys.stats()
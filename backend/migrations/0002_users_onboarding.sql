@@ -0,0 +1,7 @@
+-- Columns and index the onboarding app (front-end/my-react-app/backend) used to
+-- create on every start; older users tables may lack the coordinates.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS latitude DECIMAL(10, 8);
+ALTER TABLE users ADD COLUMN IF NOT EXISTS longitude DECIMAL(11, 8);
+
+-- Keyset pagination for GET /api/users walks this index
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users (created_at DESC, id DESC);
@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- migrate: requires task_participants
+-- Lookups of a loan's visits by participant (see the task_participants note in
+-- schema.sql); built concurrently so loads and the app keep writing meanwhile.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_participants_participant
+    ON task_participants (participant_type, participant_id);
@@ -0,0 +1,10 @@
+-- Canonical form of an Indonesian phone number, used by the phone lookups of
+-- backend/db.py and the onboarding app (see schema.sql)
+CREATE OR REPLACE FUNCTION normalize_phone(phone TEXT) RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN digits LIKE '0%' THEN '62' || substr(digits, 2)
+        WHEN digits LIKE '8%' THEN '62' || digits
+        ELSE digits
+    END
+    FROM (SELECT regexp_replace(phone, '[^0-9]', '', 'g') AS digits) d
+$$ LANGUAGE sql IMMUTABLE;
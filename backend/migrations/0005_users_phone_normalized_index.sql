@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- migrate: requires users
+-- One user per phone number. The build fails while two users share a number in
+-- different spellings (0812..., +62 812...); merge them and rerun, the invalid
+-- index left behind is dropped first.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_users_phone_normalized ON users (normalize_phone(phone));
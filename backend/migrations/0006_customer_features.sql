@@ -0,0 +1,98 @@
+-- migrate: requires customers, loans, bills
+-- customer_features and the triggers that keep it current (see schema.sql). Writes
+-- to loans and bills wait while the table is first filled at the end of this file.
+CREATE TABLE IF NOT EXISTS customer_features (
+    customer_number VARCHAR(255) PRIMARY KEY REFERENCES customers(customer_number),
+    total_paid DECIMAL(18, 2),
+    total_bill DECIMAL(18, 2),
+    current_dpd INTEGER,
+    on_time_count INTEGER,
+    total_bills_count INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Recompute features for the given customers only. Concurrent writes for the same
+-- customer queue on its customers row (FOR NO KEY UPDATE does not block FK checks),
+-- so the later one aggregates with the earlier one's rows visible; the upsert then
+-- replaces the row instead of racing a delete + insert on the primary key.
+CREATE OR REPLACE FUNCTION refresh_customer_features(customer_numbers VARCHAR[]) RETURNS void AS $$
+BEGIN
+    PERFORM 1 FROM customers WHERE customer_number = ANY(customer_numbers)
+    ORDER BY customer_number FOR NO KEY UPDATE;
+    INSERT INTO customer_features (customer_number, total_paid, total_bill, current_dpd, on_time_count, total_bills_count)
+    SELECT l.customer_number,
+           COALESCE(SUM(b.paid_amount), 0),
+           COALESCE(SUM(b.amount), 0),
+           COALESCE(MAX(l.dpd), 0),
+           COUNT(*) FILTER (WHERE b.bill_paid_date <= b.bill_scheduled_date),
+           COUNT(b.bill_id)
+    FROM loans l
+    LEFT JOIN bills b ON b.loan_id = l.loan_id
+    WHERE l.customer_number = ANY(customer_numbers)
+    GROUP BY l.customer_number
+    ON CONFLICT (customer_number) DO UPDATE
+    SET total_paid = EXCLUDED.total_paid, total_bill = EXCLUDED.total_bill, current_dpd = EXCLUDED.current_dpd,
+        on_time_count = EXCLUDED.on_time_count, total_bills_count = EXCLUDED.total_bills_count,
+        updated_at = CURRENT_TIMESTAMP;
+    -- Customers whose last loan is gone
+    DELETE FROM customer_features f
+    WHERE f.customer_number = ANY(customer_numbers)
+      AND NOT EXISTS (SELECT 1 FROM loans l WHERE l.customer_number = f.customer_number);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Full rebuild, e.g. after restoring data with triggers bypassed
+CREATE OR REPLACE FUNCTION refresh_all_customer_features() RETURNS void AS $$
+BEGIN
+    PERFORM refresh_customer_features(ARRAY(SELECT DISTINCT customer_number FROM loans WHERE customer_number IS NOT NULL));
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION loans_refresh_customer_features() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_customer_features(ARRAY(SELECT DISTINCT customer_number FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_customer_features(ARRAY(SELECT DISTINCT customer_number FROM old_rows));
+    ELSE
+        PERFORM refresh_customer_features(ARRAY(
+            SELECT customer_number FROM new_rows UNION SELECT customer_number FROM old_rows));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bills_refresh_customer_features() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_customer_features(ARRAY(
+            SELECT DISTINCT l.customer_number FROM new_rows n JOIN loans l ON l.loan_id = n.loan_id));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_customer_features(ARRAY(
+            SELECT DISTINCT l.customer_number FROM old_rows o JOIN loans l ON l.loan_id = o.loan_id));
+    ELSE
+        PERFORM refresh_customer_features(ARRAY(
+            SELECT l.customer_number FROM new_rows n JOIN loans l ON l.loan_id = n.loan_id
+            UNION
+            SELECT l.customer_number FROM old_rows o JOIN loans l ON l.loan_id = o.loan_id));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables cannot be shared across events, hence one trigger per event
+CREATE OR REPLACE TRIGGER trg_loans_features_insert AFTER INSERT ON loans
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION loans_refresh_customer_features();
+CREATE OR REPLACE TRIGGER trg_loans_features_update AFTER UPDATE ON loans
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION loans_refresh_customer_features();
+CREATE OR REPLACE TRIGGER trg_loans_features_delete AFTER DELETE ON loans
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION loans_refresh_customer_features();
+CREATE OR REPLACE TRIGGER trg_bills_features_insert AFTER INSERT ON bills
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bills_refresh_customer_features();
+CREATE OR REPLACE TRIGGER trg_bills_features_update AFTER UPDATE ON bills
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bills_refresh_customer_features();
+CREATE OR REPLACE TRIGGER trg_bills_features_delete AFTER DELETE ON bills
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION bills_refresh_customer_features();
+
+-- Fill it for the existing loans and bills; the triggers keep it current from here
+SELECT refresh_all_customer_features();
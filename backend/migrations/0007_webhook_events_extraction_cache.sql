@@ -0,0 +1,45 @@
+-- Tables of the WAHA webhook queue and the Gemini extraction cache (see schema.sql)
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id BIGSERIAL PRIMARY KEY,
+    chat_id VARCHAR(255),
+    message_id VARCHAR(255),
+    event VARCHAR(50),
+    payload JSONB,
+    status VARCHAR(20) DEFAULT 'pending', -- 'pending', 'processing', 'done', 'failed'
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_events_active ON webhook_events(id) WHERE status IN ('pending', 'processing');
+CREATE INDEX IF NOT EXISTS idx_webhook_events_chat ON webhook_events(chat_id, id) WHERE status IN ('pending', 'processing');
+CREATE INDEX IF NOT EXISTS idx_webhook_events_processed ON webhook_events(processed_at) WHERE status = 'done';
+
+-- Message ids already accepted by POST /webhook (backend/webhook_queue.py), so a
+-- WAHA retry never triggers the Gemini extraction twice. One row per message id:
+-- a second consumer writing here would drop the messages the first one took.
+CREATE TABLE IF NOT EXISTS webhook_dedupe (
+    message_id VARCHAR(255) PRIMARY KEY,
+    source VARCHAR(50), -- 'backend', 'n8n'
+    seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_dedupe_seen ON webhook_dedupe(seen_at);
+
+-- Gemini results for note / receipt photos, see backend/extraction.py
+CREATE TABLE IF NOT EXISTS extraction_cache (
+    content_hash CHAR(64) PRIMARY KEY, -- sha256 of the image bytes
+    phash BIGINT, -- 64-bit dHash, matched by Hamming distance
+    version INTEGER,
+    result JSONB,
+    hits INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    scope VARCHAR(255) -- chat/user that sent the image; near matches stay within it
+);
+
+CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_hit ON extraction_cache(last_hit_at);
+CREATE INDEX IF NOT EXISTS idx_extraction_cache_scope ON extraction_cache(scope, created_at) WHERE scope IS NOT NULL;
@@ -0,0 +1,70 @@
+-- Partition maintenance functions for bills and task_participants (see schema.sql);
+-- 0010 and 0011 convert the tables themselves.
+
+-- Monthly partitions: <table>_pYYYYMM covering [month, month + 1).
+-- Creates the missing partitions for every month between from_date and to_date;
+-- load_data.py calls it for the date range of each chunk before inserting.
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent REGCLASS, from_date DATE, to_date DATE) RETURNS INTEGER AS $$
+DECLARE
+    parent_schema TEXT;
+    parent_name TEXT;
+    partition_name TEXT;
+    month DATE;
+    created INTEGER := 0;
+BEGIN
+    IF from_date IS NULL OR to_date IS NULL THEN
+        RETURN 0;
+    END IF;
+    IF to_date - from_date > 366 * 50 THEN
+        RAISE EXCEPTION 'refusing to create partitions for % .. %, check the dates in the data', from_date, to_date;
+    END IF;
+    SELECT n.nspname, c.relname INTO parent_schema, parent_name
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace WHERE c.oid = parent;
+    -- Two loaders adding the same month would otherwise race on CREATE TABLE
+    PERFORM pg_advisory_xact_lock(parent::oid::bigint);
+
+    month := date_trunc('month', from_date)::date;
+    WHILE month <= to_date LOOP
+        partition_name := parent_name || '_p' || to_char(month, 'YYYYMM');
+        -- Covered already, by its own partition or a wider one such as <table>_legacy
+        IF NOT EXISTS (SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid,
+                              regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \((.*)\) TO \((.*)\)') b
+                       WHERE i.inhparent = parent
+                         AND (b[1] = 'MINVALUE' OR month >= btrim(b[1], '''')::date)
+                         AND (b[2] = 'MAXVALUE' OR month < btrim(b[2], '''')::date)) THEN
+            IF to_regclass(format('%I.%I', parent_schema, partition_name)) IS NOT NULL THEN
+                RAISE EXCEPTION '% exists but is not attached to % (detached by retention?); drop or reattach it before loading that month',
+                                partition_name, parent;
+            END IF;
+            EXECUTE format('CREATE TABLE %I.%I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                           parent_schema, partition_name, parent, month, (month + interval '1 month')::date);
+            created := created + 1;
+        END IF;
+        month := (month + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Retention: detach the monthly partitions older than the last keep_months months.
+-- Detached partitions stay as ordinary tables (archive or DROP them); customer_features
+-- is not recomputed, so it keeps counting their bills until refresh_all_customer_features().
+CREATE OR REPLACE FUNCTION detach_monthly_partitions(parent REGCLASS, keep_months INTEGER) RETURNS SETOF TEXT AS $$
+DECLARE
+    parent_schema TEXT;
+    partition_name TEXT;
+    cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => keep_months))::date;
+BEGIN
+    SELECT n.nspname INTO parent_schema
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace WHERE c.oid = parent;
+    FOR partition_name IN
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent AND c.relname ~ '_p[0-9]{6}$'
+          AND to_date(right(c.relname, 6), 'YYYYMM') < cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE %s DETACH PARTITION %I.%I', parent, parent_schema, partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,13 @@
+-- migrate: no-transaction
+-- migrate: requires users
+-- GET /api/users pages on (created_at, id), so created_at must never be NULL.
+-- The CHECK goes in NOT VALID first (instant, and new NULLs are rejected from
+-- here on), old NULLs are backfilled with the epoch so they sort last, and the
+-- scan happens in VALIDATE, which does not block writes. SET NOT NULL then
+-- uses the validated CHECK instead of scanning again under its exclusive lock.
+ALTER TABLE users DROP CONSTRAINT IF EXISTS users_created_at_present;
+ALTER TABLE users ADD CONSTRAINT users_created_at_present CHECK (created_at IS NOT NULL) NOT VALID;
+UPDATE users SET created_at = '1970-01-01' WHERE created_at IS NULL;
+ALTER TABLE users VALIDATE CONSTRAINT users_created_at_present;
+ALTER TABLE users ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE users DROP CONSTRAINT users_created_at_present;
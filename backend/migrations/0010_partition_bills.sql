@@ -0,0 +1,69 @@
+-- migrate: no-transaction
+-- migrate: requires bills
+-- migrate: skip-if SELECT relkind = 'p' FROM pg_class WHERE oid = 'bills'::regclass
+-- Convert bills to monthly range partitions (see schema.sql) without copying it.
+-- The existing table is attached as one partition, bills_legacy, covering every
+-- month up to its newest bill; monthly partitions start after that. The checks
+-- ATTACH needs are built first without blocking writes (NOT VALID, VALIDATE,
+-- CONCURRENTLY), so the swap itself only holds its locks for milliseconds.
+-- Bills beyond the newest month are rejected until the swap, so do not load
+-- bills while this runs. A bill without bill_scheduled_date fails VALIDATE.
+
+-- Every row before the first month after the newest bill
+DO $$
+DECLARE
+    upper_bound DATE;
+BEGIN
+    SELECT (date_trunc('month', coalesce(max(bill_scheduled_date), CURRENT_DATE)) + interval '1 month')::date
+    INTO upper_bound FROM bills;
+    ALTER TABLE bills DROP CONSTRAINT IF EXISTS bills_legacy_bound;
+    EXECUTE format('ALTER TABLE bills ADD CONSTRAINT bills_legacy_bound
+                    CHECK (bill_scheduled_date IS NOT NULL AND bill_scheduled_date < %L) NOT VALID', upper_bound);
+END
+$$;
+ALTER TABLE bills VALIDATE CONSTRAINT bills_legacy_bound;
+ALTER TABLE bills ALTER COLUMN bill_scheduled_date SET NOT NULL;
+
+-- The partitioned primary key needs the partition key; bill_id stays unique (load_data.py)
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS bills_legacy_pkey ON bills (bill_id, bill_scheduled_date);
+
+DO $$
+DECLARE
+    upper_bound DATE;
+BEGIN
+    SELECT substring(pg_get_constraintdef(oid) FROM '''([0-9-]+)''')::date INTO upper_bound
+    FROM pg_constraint WHERE conrelid = 'bills'::regclass AND conname = 'bills_legacy_bound';
+
+    ALTER TABLE bills DROP CONSTRAINT bills_pkey;
+    ALTER TABLE bills ADD CONSTRAINT bills_legacy_pkey PRIMARY KEY USING INDEX bills_legacy_pkey;
+    -- Statement triggers with transition tables belong on the parent
+    DROP TRIGGER IF EXISTS trg_bills_features_insert ON bills;
+    DROP TRIGGER IF EXISTS trg_bills_features_update ON bills;
+    DROP TRIGGER IF EXISTS trg_bills_features_delete ON bills;
+    ALTER INDEX IF EXISTS idx_bills_loan RENAME TO bills_legacy_loan_idx;
+    ALTER TABLE bills RENAME TO bills_legacy;
+
+    CREATE TABLE bills (
+        bill_id VARCHAR(255),
+        loan_id VARCHAR(255) REFERENCES loans(loan_id),
+        bill_scheduled_date DATE NOT NULL,
+        bill_paid_date DATE,
+        amount DECIMAL(15, 2),
+        paid_amount DECIMAL(15, 2),
+        PRIMARY KEY (bill_id, bill_scheduled_date)
+    ) PARTITION BY RANGE (bill_scheduled_date);
+    CREATE INDEX idx_bills_loan ON bills(loan_id);
+
+    -- bills_legacy_bound proves the partition bound, so ATTACH does not scan the rows;
+    -- its primary key, loan index and foreign key are reused as the partition's own
+    EXECUTE format('ALTER TABLE bills ATTACH PARTITION bills_legacy FOR VALUES FROM (MINVALUE) TO (%L)', upper_bound);
+    ALTER TABLE bills_legacy DROP CONSTRAINT bills_legacy_bound;
+
+    CREATE TRIGGER trg_bills_features_insert AFTER INSERT ON bills
+        REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bills_refresh_customer_features();
+    CREATE TRIGGER trg_bills_features_update AFTER UPDATE ON bills
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bills_refresh_customer_features();
+    CREATE TRIGGER trg_bills_features_delete AFTER DELETE ON bills
+        REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION bills_refresh_customer_features();
+END
+$$;
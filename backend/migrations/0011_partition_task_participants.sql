@@ -0,0 +1,80 @@
+-- migrate: no-transaction
+-- migrate: requires task_participants, tasks
+-- migrate: skip-if SELECT relkind = 'p' FROM pg_class WHERE oid = 'task_participants'::regclass
+-- Convert task_participants to monthly range partitions on task_date (see schema.sql),
+-- online in the same way as 0010: task_date is added and backfilled in batches, then
+-- the table is attached as task_participants_legacy, covering every month up to the
+-- newest visit. Do not load task_participants while this runs.
+
+ALTER TABLE task_participants ADD COLUMN IF NOT EXISTS task_date DATE;
+ALTER TABLE task_participants ALTER COLUMN task_date SET DEFAULT '-infinity';
+
+-- Start date of the task; '-infinity' for orphans, which have none. One commit per batch.
+DO $$
+DECLARE
+    last_id INTEGER := 0;
+    max_id INTEGER;
+BEGIN
+    SELECT max(id) INTO max_id FROM task_participants;
+    WHILE last_id < max_id LOOP
+        UPDATE task_participants p
+        SET task_date = coalesce((SELECT t.start_datetime::date FROM tasks t WHERE t.task_id = p.task_id), '-infinity')
+        WHERE p.id > last_id AND p.id <= last_id + 10000 AND p.task_date IS NULL;
+        COMMIT;
+        last_id := last_id + 10000;
+    END LOOP;
+END
+$$;
+
+DO $$
+DECLARE
+    upper_bound DATE;
+BEGIN
+    SELECT (date_trunc('month', coalesce(max(task_date) FILTER (WHERE isfinite(task_date)), CURRENT_DATE))
+            + interval '1 month')::date
+    INTO upper_bound FROM task_participants;
+    ALTER TABLE task_participants DROP CONSTRAINT IF EXISTS task_participants_legacy_bound;
+    EXECUTE format('ALTER TABLE task_participants ADD CONSTRAINT task_participants_legacy_bound
+                    CHECK (task_date IS NOT NULL AND task_date < %L) NOT VALID', upper_bound);
+END
+$$;
+ALTER TABLE task_participants VALIDATE CONSTRAINT task_participants_legacy_bound;
+ALTER TABLE task_participants ALTER COLUMN task_date SET NOT NULL;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS task_participants_legacy_pkey ON task_participants (id, task_date);
+
+DO $$
+DECLARE
+    upper_bound DATE;
+BEGIN
+    SELECT substring(pg_get_constraintdef(oid) FROM '''([0-9-]+)''')::date INTO upper_bound
+    FROM pg_constraint WHERE conrelid = 'task_participants'::regclass AND conname = 'task_participants_legacy_bound';
+
+    ALTER TABLE task_participants DROP CONSTRAINT task_participants_pkey;
+    ALTER TABLE task_participants ADD CONSTRAINT task_participants_legacy_pkey PRIMARY KEY USING INDEX task_participants_legacy_pkey;
+    ALTER INDEX IF EXISTS idx_task_participants_task RENAME TO task_participants_legacy_task_idx;
+    ALTER INDEX IF EXISTS idx_task_participants_participant RENAME TO task_participants_legacy_participant_idx;
+    ALTER TABLE task_participants RENAME TO task_participants_legacy;
+
+    -- Keeps the existing id sequence (and its position) instead of starting a new one
+    CREATE TABLE task_participants (
+        id INTEGER NOT NULL DEFAULT nextval('task_participants_id_seq'),
+        task_id VARCHAR(255),
+        participant_type VARCHAR(50),
+        participant_id VARCHAR(255),
+        is_face_matched BOOLEAN,
+        is_qr_matched BOOLEAN,
+        payment_amount DECIMAL(15, 2),
+        task_date DATE NOT NULL DEFAULT '-infinity',
+        PRIMARY KEY (id, task_date)
+    ) PARTITION BY RANGE (task_date);
+    CREATE INDEX idx_task_participants_task ON task_participants(task_id);
+    CREATE INDEX idx_task_participants_participant ON task_participants(participant_type, participant_id);
+
+    EXECUTE format('ALTER TABLE task_participants ATTACH PARTITION task_participants_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+                   upper_bound);
+    ALTER TABLE task_participants_legacy DROP CONSTRAINT task_participants_legacy_bound;
+    CREATE TABLE task_participants_default PARTITION OF task_participants DEFAULT;
+    ALTER SEQUENCE task_participants_id_seq OWNED BY task_participants.id;
+END
+$$;
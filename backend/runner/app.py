@@ -1,48 +1,164 @@
 #!/usr/bin/env python3
-from flask import Flask, request, jsonify, make_response
-import subprocess, os
+from flask import Flask, request, jsonify, make_response, Response
+import json, math, os
+
+from warm_pool import WarmPool
+from jobs import JobScheduler, Rejected
+from result_cache import ResultCache
 
 app = Flask(__name__)
 
-@app.get("/healthz")
-def healthz():
-  resp = make_response("ok", 200)
+# Scripts run in pre-imported worker processes unless WARM_POOL=0 or the request sends "warm": false
+WARM_POOL = os.getenv("WARM_POOL", "1") == "1"
+pool = None
+scheduler = None
+results = ResultCache()
+
+def reply(body, status=200):
+  resp = make_response(body, status)
   resp.headers["Connection"] = "close"
   return resp
 
-@app.post("/run")
-def run():
-  data = request.get_json(force=True) or {}
+@app.get("/healthz")
+def healthz():
+  return reply("ok")
+
+@app.get("/pool")
+def pool_status():
+  return reply(jsonify(pool=pool.status() if pool else {"enabled": False}, scheduler=scheduler.status()))
+
+def parse(data):
+  """(entry, path, args, env) from a /run or /jobs body."""
   entry = data.get("entry","agent.py")
   args  = list(map(str, data.get("args", [])))
-  path  = f"/code/{entry}"
+  env   = {str(k): str(v) for k, v in (data.get("env", {}) or {}).items()}
+  return entry, f"/code/{entry}", args, env
+
+def submit(data):
+  """Validate a /run or /jobs body and queue it; returns (job, error_response)."""
+  entry, path, args, env = parse(data)
   if not os.path.exists(path):
-    resp = make_response(jsonify(error=f"not found: {entry}"), 404)
-    resp.headers["Connection"] = "close"
-    return resp
+    return None, reply(jsonify(error=f"not found: {entry}"), 404)
 
   timeout_sec = int(data.get("timeout", os.getenv("RUN_TIMEOUT_SEC", "1800")))
-  env = os.environ.copy()
-  for k, v in (data.get("env", {}) or {}).items():
-    env[str(k)] = str(v)
+  try:
+    return scheduler.submit(entry, path, args, env, timeout_sec, data.get("warm", True)), None
+  except Rejected as e:
+    # Shed load instead of forking more interpreters; n8n can retry after the hint
+    resp = reply(jsonify(error=str(e), retry_after=e.retry_after), 429)
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return None, resp
+
+def cache_ttl(data):
+  """The body's "cache_ttl" (None if absent); ValueError unless it is a positive number of seconds."""
+  ttl = data.get("cache_ttl")
+  if ttl is None:
+    return None
+  if isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or not math.isfinite(ttl) or ttl <= 0:
+    raise ValueError(f"cache_ttl must be a positive number of seconds, got {ttl!r}")
+  return ttl
 
+def cache_status(resp, status):
+  resp.headers["X-Runner-Cache"] = status
+  return resp
+
+@app.post("/run")
+def run():
+  """
+  Synchronous run: waits for the job and returns its (capped) output.
+  With "cache": true a successful result is reused for identical runs
+  ("cache": "refresh" re-runs and stores); X-Runner-Cache says which happened.
+  """
+  data = request.get_json(force=True) or {}
   try:
-    out = subprocess.check_output(
-      ["python", path, *args],
-      stderr=subprocess.STDOUT, text=True,
-      timeout=timeout_sec, env=env, cwd="/code"
-    )
-    resp = make_response(jsonify(output=out), 200)
-    resp.headers["Connection"] = "close"
-    return resp
-  except subprocess.CalledProcessError as e:
-    resp = make_response(jsonify(error=e.output, returncode=e.returncode), 500)
-    resp.headers["Connection"] = "close"
-    return resp
-  except subprocess.TimeoutExpired as e:
-    resp = make_response(jsonify(error=f"timeout after {timeout_sec}s", output=e.output or ""), 504)
-    resp.headers["Connection"] = "close"
-    return resp
+    ttl = cache_ttl(data)
+  except ValueError as e:
+    return cache_status(reply(jsonify(error=str(e)), 400), "BYPASS")
+  key, status = None, "BYPASS"
+  if data.get("cache"):
+    entry, path, args, env = parse(data)
+    if os.path.exists(path):
+      key, status = results.key(entry, path, args, env), "MISS"
+      if data["cache"] != "refresh":
+        out = results.get(key)
+        if out is not None:
+          return cache_status(reply(jsonify(output=out), 200), "HIT")
+      else:
+        status = "REFRESH"
+
+  job, error = submit(data)
+  if error:
+    return cache_status(error, status)
+
+  job.done.wait()
+  out = job.read_output()
+  truncated = scheduler.max_output and job.output_size() > scheduler.max_output
+  scheduler.discard(job)
+  if job.status == "timeout":
+    return cache_status(reply(jsonify(error=f"timeout after {job.timeout}s", output=out), 504), status)
+  if job.returncode != 0:
+    return cache_status(reply(jsonify(error=out, returncode=job.returncode), 500), status)
+  if key and not truncated:
+    results.set(key, job.entry, out, ttl)
+  return cache_status(reply(jsonify(output=out), 200), status)
+
+@app.get("/cache")
+def cache_stats():
+  return reply(jsonify(results.stats()))
+
+@app.delete("/cache")
+def cache_invalidate():
+  """Drop cached results: all of them, or ?entry=report.py for one script."""
+  return reply(jsonify(invalidated=results.invalidate(request.args.get("entry"))))
+
+@app.post("/jobs")
+def create_job():
+  """Queue a script run and return its id right away."""
+  job, error = submit(request.get_json(force=True) or {})
+  if error:
+    return error
+  return reply(jsonify(id=job.id, status=job.status, stream=f"/jobs/{job.id}/stream"), 202)
+
+@app.get("/jobs/<job_id>")
+def get_job(job_id):
+  """Job status; the output is included once the job has finished."""
+  job = scheduler.get(job_id)
+  if job is None:
+    return reply(jsonify(error=f"unknown job: {job_id}"), 404)
+  body = job.to_dict()
+  if job.finished:
+    body["output"] = job.read_output()
+  return reply(jsonify(body))
+
+@app.get("/jobs/<job_id>/stream")
+def stream_job(job_id):
+  """
+  Live output. Plain chunked text by default; Server-Sent Events when the
+  client sends Accept: text/event-stream (one event per line, then an `end` event).
+  """
+  job = scheduler.get(job_id)
+  if job is None:
+    return reply(jsonify(error=f"unknown job: {job_id}"), 404)
+
+  if "text/event-stream" not in request.headers.get("Accept", ""):
+    return Response(scheduler.stream(job), mimetype="text/plain")
+
+  def events():
+    pending = b""
+    for chunk in scheduler.stream(job):
+      pending += chunk
+      *lines, pending = pending.split(b"\n")
+      for line in lines:
+        yield f"data: {line.decode(errors='replace')}\n\n"
+    if pending:
+      yield f"data: {pending.decode(errors='replace')}\n\n"
+    yield f"event: end\ndata: {json.dumps(job.to_dict())}\n\n"
+
+  return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 if __name__ == "__main__":
+  if WARM_POOL:
+    pool = WarmPool()
+    pool.start()
+  scheduler = JobScheduler(pool)
   app.run(host="0.0.0.0", port=8000, threaded=True)
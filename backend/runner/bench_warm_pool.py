@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Cold vs warm latency for /run-style script execution.
+
+Runs a small report-like script (imports pandas + a Postgres driver, builds a
+DataFrame, prints a summary) N times as a fresh `python` subprocess and N times
+on the warm pool, then prints mean / p50 / p95 per mode.
+
+  python bench_warm_pool.py --runs 20 --workers 2
+"""
+import argparse, os, statistics, subprocess, sys, tempfile, time
+
+from warm_pool import WarmPool
+
+PROBE = """
+import sys
+import pandas as pd
+try:
+  import psycopg2
+except ImportError:
+  pass
+df = pd.DataFrame({"amount": range(1000)})
+print("rows", len(df), "sum", int(df.amount.sum()), "args", sys.argv[1:])
+"""
+
+def summarize(name, samples):
+  samples = sorted(samples)
+  p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+  print(f"{name:>5}: mean {statistics.mean(samples) * 1000:8.1f} ms | "
+        f"p50 {statistics.median(samples) * 1000:8.1f} ms | p95 {p95 * 1000:8.1f} ms")
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark cold subprocess vs warm pool script runs")
+  parser.add_argument("--runs", type=int, default=20)
+  parser.add_argument("--workers", type=int, default=2)
+  args = parser.parse_args()
+
+  workdir = tempfile.mkdtemp(prefix="bench-runner-")
+  path = os.path.join(workdir, "probe.py")
+  with open(path, "w") as f:
+    f.write(PROBE)
+
+  cold = []
+  for i in range(args.runs):
+    start = time.perf_counter()
+    subprocess.check_output([sys.executable, path, str(i)], stderr=subprocess.STDOUT, cwd=workdir)
+    cold.append(time.perf_counter() - start)
+
+  start = time.perf_counter()
+  pool = WarmPool(size=args.workers, imports=["pandas", "psycopg2"])
+  pool.start()
+  print(f"warm pool startup: {(time.perf_counter() - start) * 1000:.1f} ms (paid once)")
+
+  warm = []
+  for i in range(args.runs):
+    output_path = os.path.join(workdir, f"warm-{i}.log")
+    start = time.perf_counter()
+    returncode, _ = pool.run(path, [str(i)], {}, workdir, 60, output_path)
+    with open(output_path) as f:
+      output = f.read()
+    warm.append(time.perf_counter() - start)
+    if returncode != 0:
+      sys.exit(f"warm run failed: {output}")
+
+  print(f"{args.runs} runs each")
+  summarize("cold", cold)
+  summarize("warm", warm)
+  print(f"speedup (p50): {statistics.median(cold) / statistics.median(warm):.1f}x")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Job scheduler for the python-runner.
+
+Every script run (POST /jobs, and /run which waits for its job) becomes a Job.
+Jobs execute on a fixed set of scheduler threads (JOB_CONCURRENCY), so the
+number of HTTP connections no longer decides how many scripts run at once.
+Output goes straight to JOBS_DIR/<id>.log, capped at JOB_OUTPUT_MAX_BYTES;
+readers stream it from disk instead of holding it in memory. Finished jobs
+and their logs are removed after JOB_RETENTION_SEC.
+
+Admission: at most RUNNER_QUEUE_MAX jobs wait, and each entry script may have
+at most its quota (RUNNER_ENTRY_QUOTA, overridable per script with
+RUNNER_ENTRY_QUOTAS='{"report.py": 2}') queued or running; beyond that submit()
+raises Rejected with a Retry-After estimate. Waiting jobs are dispatched
+round-robin across entry scripts, so a burst of one report cannot starve the
+others, and no new job starts while available memory is below
+RUNNER_MIN_FREE_MB (unless nothing is running).
+"""
+import json, os, subprocess, threading, time, uuid
+from collections import OrderedDict, deque
+
+from warm_pool import copy_capped, WARM_WORKERS
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", str(WARM_WORKERS)))
+JOBS_DIR = os.getenv("JOBS_DIR", "/tmp/runner-jobs")
+JOB_OUTPUT_MAX_BYTES = int(os.getenv("JOB_OUTPUT_MAX_BYTES", str(10 * 2**20)))
+JOB_RETENTION_SEC = int(os.getenv("JOB_RETENTION_SEC", "3600"))
+RUNNER_QUEUE_MAX = int(os.getenv("RUNNER_QUEUE_MAX", "50"))
+RUNNER_ENTRY_QUOTA = int(os.getenv("RUNNER_ENTRY_QUOTA", "10"))
+RUNNER_ENTRY_QUOTAS = json.loads(os.getenv("RUNNER_ENTRY_QUOTAS", "{}") or "{}")
+RUNNER_MIN_FREE_MB = int(os.getenv("RUNNER_MIN_FREE_MB", "512"))
+
+class Rejected(Exception):
+  def __init__(self, reason, retry_after):
+    super().__init__(reason)
+    self.retry_after = retry_after
+
+def available_memory_mb():
+  """MemAvailable, or the container's cgroup headroom when that is smaller."""
+  available = None
+  try:
+    with open("/proc/meminfo") as f:
+      for line in f:
+        if line.startswith("MemAvailable:"):
+          available = int(line.split()[1]) / 1024
+          break
+  except OSError:
+    pass
+  try:
+    with open("/sys/fs/cgroup/memory.max") as f:
+      limit = f.read().strip()
+    if limit != "max":
+      with open("/sys/fs/cgroup/memory.current") as f:
+        headroom = (int(limit) - int(f.read())) / 2**20
+      available = headroom if available is None else min(available, headroom)
+  except (OSError, ValueError):
+    pass
+  return available
+
+def run_cold(path, args, env, cwd, timeout, output_path, max_output):
+  """Fresh interpreter per run; returns (returncode, timed_out)."""
+  proc = subprocess.Popen(
+    ["python", path, *args],
+    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+    env={**os.environ, **env}, cwd=cwd
+  )
+  reader = threading.Thread(target=copy_capped, args=(os.dup(proc.stdout.fileno()), output_path, max_output))
+  reader.start()
+  proc.stdout.close()
+  try:
+    returncode, timed_out = proc.wait(timeout), False
+  except subprocess.TimeoutExpired:
+    proc.kill()
+    proc.wait()
+    returncode, timed_out = None, True
+  reader.join(5)
+  return returncode, timed_out
+
+class Job:
+  def __init__(self, entry, path, args, env, timeout, warm, jobs_dir):
+    self.id = uuid.uuid4().hex
+    self.entry = entry
+    self.path = path
+    self.args = args
+    self.env = env
+    self.timeout = timeout
+    self.warm = warm
+    self.output_path = os.path.join(jobs_dir, f"{self.id}.log")
+    self.status = "queued"  # 'queued', 'running', 'done', 'failed', 'timeout'
+    self.returncode = None
+    self.created_at = time.time()
+    self.started_at = None
+    self.finished_at = None
+    self.done = threading.Event()
+
+  @property
+  def finished(self):
+    return self.done.is_set()
+
+  def output_size(self):
+    try:
+      return os.path.getsize(self.output_path)
+    except OSError:
+      return 0
+
+  def read_output(self):
+    try:
+      with open(self.output_path, errors="replace") as f:
+        return f.read()
+    except OSError:
+      return ""
+
+  def to_dict(self):
+    return {
+      "id": self.id,
+      "entry": self.entry,
+      "args": self.args,
+      "status": self.status,
+      "returncode": self.returncode,
+      "created_at": self.created_at,
+      "started_at": self.started_at,
+      "finished_at": self.finished_at,
+      "output_bytes": self.output_size()
+    }
+
+class JobScheduler:
+  def __init__(self, pool=None, concurrency=JOB_CONCURRENCY, jobs_dir=JOBS_DIR,
+               max_output=JOB_OUTPUT_MAX_BYTES, retention=JOB_RETENTION_SEC,
+               queue_max=RUNNER_QUEUE_MAX, entry_quota=RUNNER_ENTRY_QUOTA,
+               entry_quotas=RUNNER_ENTRY_QUOTAS, min_free_mb=RUNNER_MIN_FREE_MB):
+    self.pool = pool
+    self.concurrency = concurrency
+    self.jobs_dir = jobs_dir
+    self.max_output = max_output
+    self.retention = retention
+    self.queue_max = queue_max
+    self.entry_quota = entry_quota
+    self.entry_quotas = entry_quotas
+    self.min_free_mb = min_free_mb
+    self.jobs = {}
+    self.lock = threading.Condition()
+    # entry -> waiting jobs; rotated on every dispatch for round-robin
+    self.waiting = OrderedDict()
+    self.queued = 0
+    self.running = 0
+    self.per_entry = {}
+    self.avg_duration = 5.0
+    self.rejected = 0
+    self.memory_waits = 0
+    os.makedirs(jobs_dir, exist_ok=True)
+    for i in range(concurrency):
+      threading.Thread(target=self._dispatch_loop, name=f"job-{i}", daemon=True).start()
+
+  def quota(self, entry):
+    return int(self.entry_quotas.get(entry, self.entry_quota))
+
+  def _retry_after(self):
+    # Time for the current backlog to drain at the current concurrency
+    return max(1, min(300, int(self.avg_duration * (self.queued + 1) / self.concurrency + 0.999)))
+
+  def submit(self, entry, path, args, env, timeout, warm=True):
+    """Queue a job; raises Rejected when the queue or the entry's quota is full."""
+    self._purge()
+    job = Job(entry, path, args, env, timeout, warm and self.pool is not None, self.jobs_dir)
+    with self.lock:
+      if self.queued >= self.queue_max:
+        self.rejected += 1
+        raise Rejected(f"runner queue is full ({self.queued} waiting)", self._retry_after())
+      if self.per_entry.get(entry, 0) >= self.quota(entry):
+        self.rejected += 1
+        raise Rejected(f"{entry} already has {self.per_entry[entry]} jobs queued or running", self._retry_after())
+
+      open(job.output_path, "wb").close()
+      self.jobs[job.id] = job
+      self.waiting.setdefault(entry, deque()).append(job)
+      self.queued += 1
+      self.per_entry[entry] = self.per_entry.get(entry, 0) + 1
+      self.lock.notify()
+    return job
+
+  def get(self, job_id):
+    with self.lock:
+      return self.jobs.get(job_id)
+
+  def _next_job(self):
+    """Pop the next job round-robin across entry scripts; call with the lock held."""
+    entry, jobs = next(iter(self.waiting.items()))
+    job = jobs.popleft()
+    del self.waiting[entry]
+    if jobs:
+      self.waiting[entry] = jobs
+    return job
+
+  def _memory_ok(self):
+    available = available_memory_mb()
+    return available is None or available >= self.min_free_mb or self.running == 0
+
+  def _dispatch_loop(self):
+    while True:
+      with self.lock:
+        while not self.waiting:
+          self.lock.wait()
+        if not self._memory_ok():
+          self.memory_waits += 1
+          self.lock.wait(1)
+          continue
+        job = self._next_job()
+        self.queued -= 1
+        self.running += 1
+
+      self._run(job)
+
+      with self.lock:
+        self.running -= 1
+        self.per_entry[job.entry] -= 1
+        if not self.per_entry[job.entry]:
+          del self.per_entry[job.entry]
+        self.avg_duration = 0.8 * self.avg_duration + 0.2 * (job.finished_at - job.started_at)
+        self.lock.notify_all()
+
+  def _run(self, job):
+    job.status = "running"
+    job.started_at = time.time()
+    try:
+      if job.warm:
+        job.returncode, timed_out = self.pool.run(
+          job.path, job.args, job.env, "/code", job.timeout, job.output_path, self.max_output)
+      else:
+        job.returncode, timed_out = run_cold(
+          job.path, job.args, job.env, "/code", job.timeout, job.output_path, self.max_output)
+      if timed_out:
+        job.status = "timeout"
+      else:
+        job.status = "done" if job.returncode == 0 else "failed"
+    except Exception as e:
+      with open(job.output_path, "a") as f:
+        f.write(f"\nrunner error: {e}\n")
+      job.status = "failed"
+    finally:
+      job.finished_at = time.time()
+      job.done.set()
+
+  def stream(self, job, poll=0.5):
+    """Yield the job's output as it is written, until the job ends."""
+    with open(job.output_path, "rb") as f:
+      while True:
+        chunk = f.read(65536)
+        if chunk:
+          yield chunk
+        elif job.finished:
+          # Pick up anything written between the last read and the end
+          rest = f.read()
+          if rest:
+            yield rest
+          return
+        else:
+          job.done.wait(poll)
+
+  def discard(self, job):
+    """Forget a finished job and delete its log (used by the synchronous /run)."""
+    with self.lock:
+      self.jobs.pop(job.id, None)
+    try:
+      os.remove(job.output_path)
+    except OSError:
+      pass
+
+  def _purge(self):
+    cutoff = time.time() - self.retention
+    with self.lock:
+      expired = [j for j in self.jobs.values() if j.finished and j.finished_at < cutoff]
+      for job in expired:
+        del self.jobs[job.id]
+    for job in expired:
+      try:
+        os.remove(job.output_path)
+      except OSError:
+        pass
+
+  def status(self):
+    with self.lock:
+      return {
+        "concurrency": self.concurrency,
+        "running": self.running,
+        "queued": self.queued,
+        "queue_max": self.queue_max,
+        "per_entry": dict(self.per_entry),
+        "rejected": self.rejected,
+        "memory_waits": self.memory_waits,
+        "available_memory_mb": available_memory_mb(),
+        "min_free_mb": self.min_free_mb,
+        "avg_duration_sec": round(self.avg_duration, 2)
+      }
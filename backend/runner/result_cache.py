@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Opt-in result cache for /run.
+
+A request with "cache": true is keyed on the entry path, the script's content
+hash, its args, the env it sends and the runner's own values of the env vars
+listed in RUNNER_CACHE_ENV (other server env vars do not split the cache).
+Only successful, untruncated runs are stored. Entries
+expire after RUNNER_CACHE_TTL seconds (or the request's "cache_ttl") and the
+least recently used ones are evicted past RUNNER_CACHE_MAX entries or
+RUNNER_CACHE_MAX_MB of output.
+
+The content hash covers the entry script only; edits to helper modules it
+imports are picked up when the entry expires or via DELETE /cache.
+"""
+import hashlib, json, os, threading, time
+from collections import OrderedDict
+
+RUNNER_CACHE_TTL = int(os.getenv("RUNNER_CACHE_TTL", "300"))
+RUNNER_CACHE_MAX = int(os.getenv("RUNNER_CACHE_MAX", "256"))
+RUNNER_CACHE_MAX_MB = int(os.getenv("RUNNER_CACHE_MAX_MB", "64"))
+RUNNER_CACHE_ENV = [k.strip() for k in os.getenv(
+  "RUNNER_CACHE_ENV", ""
+).split(",") if k.strip()]
+
+class ResultCache:
+  def __init__(self, ttl=RUNNER_CACHE_TTL, maxsize=RUNNER_CACHE_MAX,
+               max_bytes=RUNNER_CACHE_MAX_MB * 2**20, env_keys=RUNNER_CACHE_ENV):
+    self.ttl = ttl
+    self.maxsize = maxsize
+    self.max_bytes = max_bytes
+    self.env_keys = env_keys
+    self.lock = threading.Lock()
+    self.data = OrderedDict()  # key -> (expires_at, entry, output, size)
+    self.bytes = 0
+    self.hashes = {}  # path -> (mtime_ns, size, sha256)
+    self.hits = 0
+    self.misses = 0
+
+  def script_hash(self, path):
+    """sha256 of the script, re-read only when its mtime or size changes."""
+    st = os.stat(path)
+    with self.lock:
+      cached = self.hashes.get(path)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+      return cached[2]
+    with open(path, "rb") as f:
+      digest = hashlib.sha256(f.read()).hexdigest()
+    with self.lock:
+      self.hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+  def key(self, entry, path, args, env):
+    # The request env always counts; RUNNER_CACHE_ENV adds server env the script reads
+    server_env = {k: os.environ.get(k) for k in self.env_keys if k not in env}
+    raw = json.dumps([entry, self.script_hash(path), args, env, server_env], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+  def get(self, key):
+    with self.lock:
+      item = self.data.get(key)
+      if item is None or item[0] < time.monotonic():
+        if item is not None:
+          self._drop(key)
+        self.misses += 1
+        return None
+      self.data.move_to_end(key)
+      self.hits += 1
+      return item[2]
+
+  def set(self, key, entry, output, ttl=None):
+    size = len(output.encode())
+    if size > self.max_bytes:
+      return
+    with self.lock:
+      if key in self.data:
+        self._drop(key)
+      self.data[key] = (time.monotonic() + (ttl or self.ttl), entry, output, size)
+      self.bytes += size
+      while len(self.data) > self.maxsize or self.bytes > self.max_bytes:
+        self._drop(next(iter(self.data)))
+
+  def _drop(self, key):
+    self.bytes -= self.data.pop(key)[3]
+
+  def invalidate(self, entry=None):
+    """Drop every entry, or only the ones for one entry script; returns how many."""
+    with self.lock:
+      keys = [k for k, item in self.data.items() if entry is None or item[1] == entry]
+      for key in keys:
+        self._drop(key)
+      if entry is None:
+        self.hashes.clear()
+      return len(keys)
+
+  def stats(self):
+    with self.lock:
+      lookups = self.hits + self.misses
+      return {
+        "size": len(self.data),
+        "maxsize": self.maxsize,
+        "bytes": self.bytes,
+        "max_bytes": self.max_bytes,
+        "ttl": self.ttl,
+        "env_keys": self.env_keys,
+        "hits": self.hits,
+        "misses": self.misses,
+        "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+      }
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Warm worker pool for /run.
+
+A forkserver process imports the heavy modules (pandas, psycopg, playwright, ...)
+once; workers are forked from it, so they start with those imports done. Each
+run executes the script with runpy in a fresh __main__ namespace, with its own
+argv, env and cwd, and stdout/stderr (fd 1/2, so child processes too) redirected
+to a log file. Helper modules imported from the script's directory are dropped
+afterwards.
+A worker is replaced after a timeout or crash, after WARM_MAX_RUNS runs, or once
+its RSS passes WARM_MAX_RSS_MB.
+"""
+import multiprocessing as mp
+import os, queue, runpy, sys, threading, traceback
+
+WARM_WORKERS = int(os.getenv("WARM_WORKERS", "4"))
+WARM_MAX_RUNS = int(os.getenv("WARM_MAX_RUNS", "50"))
+WARM_MAX_RSS_MB = int(os.getenv("WARM_MAX_RSS_MB", "1024"))
+# Modules that fail to import are skipped by the forkserver
+WARM_IMPORTS = [m.strip() for m in os.getenv(
+  "WARM_IMPORTS", "pandas,numpy,psycopg,psycopg2,requests,openpyxl,fitz,PIL.Image,playwright.sync_api"
+).split(",") if m.strip()]
+
+def rss_mb():
+  with open("/proc/self/statm") as f:
+    return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def copy_capped(src_fd, output_path, limit):
+  """Copy a pipe into output_path, keeping the first `limit` bytes (all when 0); returns bytes dropped."""
+  kept = dropped = 0
+  with open(output_path, "ab") as out:
+    while True:
+      chunk = os.read(src_fd, 65536)
+      if not chunk:
+        break
+      room = max(limit - kept, 0) if limit else len(chunk)
+      if room:
+        out.write(chunk[:room])
+        out.flush()
+        kept += min(room, len(chunk))
+      dropped += max(len(chunk) - room, 0)
+    if dropped:
+      out.write(f"\n[output truncated: {dropped} bytes dropped]\n".encode())
+  os.close(src_fd)
+  return dropped
+
+def run_script(path, args, env, cwd, output_path, max_output=0):
+  """
+  Run one script in this process like `python path *args`; returns its exit code.
+  Output goes to output_path, capped at max_output bytes when set.
+  """
+  saved_env, saved_argv, saved_path = os.environ.copy(), sys.argv[:], sys.path[:]
+  saved_cwd, saved_modules = os.getcwd(), set(sys.modules)
+  sys.stdout.flush(); sys.stderr.flush()
+  if max_output:
+    read_fd, out_fd = os.pipe()
+    reader = threading.Thread(target=copy_capped, args=(read_fd, output_path, max_output), daemon=True)
+    reader.start()
+  else:
+    reader = None
+    out_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+  saved_fds = os.dup(1), os.dup(2)
+  os.dup2(out_fd, 1); os.dup2(out_fd, 2); os.close(out_fd)
+
+  returncode = 0
+  try:
+    os.environ.update(env)
+    sys.argv = [path, *args]
+    sys.path.insert(0, os.path.dirname(path))
+    os.chdir(cwd)
+    runpy.run_path(path, run_name="__main__")
+  except SystemExit as e:
+    if e.code is None or isinstance(e.code, int):
+      returncode = e.code or 0
+    else:
+      print(e.code, file=sys.stderr)
+      returncode = 1
+  except BaseException:
+    traceback.print_exc()
+    returncode = 1
+  finally:
+    sys.stdout.flush(); sys.stderr.flush()
+    os.dup2(saved_fds[0], 1); os.dup2(saved_fds[1], 2)
+    os.close(saved_fds[0]); os.close(saved_fds[1])
+    if reader:
+      # EOF arrives once no child process still holds the pipe
+      reader.join(5)
+    os.environ.clear(); os.environ.update(saved_env)
+    sys.argv, sys.path[:] = saved_argv, saved_path
+    os.chdir(saved_cwd)
+    # Drop the script's own helper modules so edits show up on the next run;
+    # library modules it pulled in stay cached for later runs
+    script_dir = os.path.dirname(os.path.abspath(path)) + os.sep
+    for name in set(sys.modules) - saved_modules:
+      module_file = getattr(sys.modules[name], "__file__", None) or ""
+      if os.path.abspath(module_file).startswith(script_dir):
+        del sys.modules[name]
+  return returncode
+
+def worker_main(conn):
+  while True:
+    try:
+      task = conn.recv()
+    except EOFError:
+      break
+    if task is None:
+      break
+    code = run_script(**task)
+    conn.send({"returncode": code, "rss_mb": rss_mb()})
+
+class Worker:
+  def __init__(self, ctx):
+    self.conn, child = ctx.Pipe()
+    self.process = ctx.Process(target=worker_main, args=(child,), daemon=True)
+    self.process.start()
+    child.close()
+    self.runs = 0
+    self.rss_mb = 0.0
+
+  def stop(self, kill=False):
+    try:
+      if kill:
+        self.process.kill()
+      else:
+        self.conn.send(None)
+      self.process.join(5)
+      if self.process.is_alive():
+        self.process.kill()
+        self.process.join()
+    except (OSError, ValueError):
+      pass
+    self.conn.close()
+
+class WarmPool:
+  def __init__(self, size=WARM_WORKERS, max_runs=WARM_MAX_RUNS, max_rss_mb=WARM_MAX_RSS_MB, imports=WARM_IMPORTS):
+    self.size = size
+    self.max_runs = max_runs
+    self.max_rss_mb = max_rss_mb
+    self.ctx = mp.get_context("forkserver")
+    self.ctx.set_forkserver_preload(imports)
+    self.idle = queue.Queue()
+    self.lock = threading.Lock()
+    self.stats = {"runs": 0, "timeouts": 0, "crashes": 0, "recycled": 0}
+
+  def start(self):
+    # The first spawn boots the forkserver and pays for the imports, once
+    for _ in range(self.size):
+      self.idle.put(Worker(self.ctx))
+    print(f"Warm pool ready: {self.size} workers")
+
+  def _count(self, name):
+    with self.lock:
+      self.stats[name] += 1
+
+  def run(self, path, args, env, cwd, timeout, output_path, max_output=0):
+    """Run a script on an idle worker, output to output_path; returns (returncode, timed_out)."""
+    worker = self.idle.get()
+    returncode, timed_out, healthy = None, False, True
+    try:
+      worker.conn.send({"path": path, "args": args, "env": env, "cwd": cwd,
+                        "output_path": output_path, "max_output": max_output})
+      if worker.conn.poll(timeout):
+        result = worker.conn.recv()
+        returncode, worker.rss_mb = result["returncode"], result["rss_mb"]
+      else:
+        timed_out, healthy = True, False
+        self._count("timeouts")
+    except (EOFError, OSError):
+      # The script killed its interpreter (os._exit, segfault, OOM killer)
+      healthy = False
+      worker.process.join(1)
+      returncode = worker.process.exitcode if worker.process.exitcode is not None else -9
+      self._count("crashes")
+    finally:
+      worker.runs += 1
+      self._count("runs")
+      self._release(worker, healthy)
+    return returncode, timed_out
+
+  def _release(self, worker, healthy):
+    if healthy and worker.runs < self.max_runs and worker.rss_mb < self.max_rss_mb:
+      self.idle.put(worker)
+      return
+    worker.stop(kill=not healthy)
+    self._count("recycled")
+    self.idle.put(Worker(self.ctx))
+
+  def status(self):
+    with self.lock:
+      return {"size": self.size, "idle": self.idle.qsize(), "max_runs": self.max_runs,
+              "max_rss_mb": self.max_rss_mb, **self.stats}
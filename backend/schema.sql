@@ -1,3 +1,4 @@
+-- schema_version: 11 (migrations up to this version are included; see backend/migrate.py)
 -- Enable UUID extension if needed (though IDs seem to be strings/hashes)
 -- CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
@@ -21,14 +22,26 @@ CREATE TABLE loans (
 );
 
 -- 3. Bills Table
+-- Range-partitioned by month of bill_scheduled_date (bills_pYYYYMM), so queries on
+-- recent periods only scan those months and old months can be detached cheaply.
+-- Partitions are created by create_monthly_partitions() (see below) as data is loaded.
+-- There is deliberately no DEFAULT partition: creating a month would have to scan it
+-- and fail on any rows it holds for that month. Inserting a bill for a month without
+-- a partition fails with "no partition of relation "bills" found for row"; call
+-- create_monthly_partitions('bills', from, to) first, as load_data.py does.
+-- Databases converted by migrations 0010/0011 keep their earlier rows in one wider
+-- partition, <table>_legacy, which retention does not detach.
+-- The primary key must include the partition key, so it cannot stop one bill_id from
+-- being stored under two dates; scripts/load_data.py keeps bill_id unique instead.
 CREATE TABLE bills (
-    bill_id VARCHAR(255) PRIMARY KEY,
+    bill_id VARCHAR(255),
     loan_id VARCHAR(255) REFERENCES loans(loan_id),
-    bill_scheduled_date DATE,
+    bill_scheduled_date DATE NOT NULL,
     bill_paid_date DATE,
     amount DECIMAL(15, 2),
-    paid_amount DECIMAL(15, 2)
-);
+    paid_amount DECIMAL(15, 2),
+    PRIMARY KEY (bill_id, bill_scheduled_date)
+) PARTITION BY RANGE (bill_scheduled_date);
 
 -- 4. Tasks Table
 CREATE TABLE tasks (
@@ -47,20 +60,95 @@ CREATE TABLE tasks (
 -- participant_id is polymorphic (can be loan_id, customer_id, etc.), but data suggests 'LOAN'.
 -- We will index it but maybe not enforce FK strictly if types vary, 
 -- though profiling showed 'LOAN' type, so we can try linking to loans.
+-- Range-partitioned by month of task_date, the start date of the task, which
+-- load_data.py copies from tasks.start_datetime. Orphans (no matching task) get
+-- task_date '-infinity' and land in task_participants_default.
 CREATE TABLE task_participants (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     task_id VARCHAR(255), -- REFERENCES tasks(task_id), -- Logical relationship (Note: Data may contain orphans)
     participant_type VARCHAR(50),
     participant_id VARCHAR(255), -- Logically references loans(loan_id) if type='LOAN'
     is_face_matched BOOLEAN,
     is_qr_matched BOOLEAN,
-    payment_amount DECIMAL(15, 2)
-);
+    payment_amount DECIMAL(15, 2),
+    task_date DATE NOT NULL DEFAULT '-infinity',
+    PRIMARY KEY (id, task_date)
+) PARTITION BY RANGE (task_date);
+CREATE TABLE task_participants_default PARTITION OF task_participants DEFAULT;
 
 -- Indexes for performance
 CREATE INDEX idx_loans_customer ON loans(customer_number);
 CREATE INDEX idx_bills_loan ON bills(loan_id);
 CREATE INDEX idx_task_participants_task ON task_participants(task_id);
+CREATE INDEX idx_task_participants_participant ON task_participants(participant_type, participant_id);
+
+-- Monthly partitions: <table>_pYYYYMM covering [month, month + 1).
+-- Creates the missing partitions for every month between from_date and to_date;
+-- load_data.py calls it for the date range of each chunk before inserting.
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent REGCLASS, from_date DATE, to_date DATE) RETURNS INTEGER AS $$
+DECLARE
+    parent_schema TEXT;
+    parent_name TEXT;
+    partition_name TEXT;
+    month DATE;
+    created INTEGER := 0;
+BEGIN
+    IF from_date IS NULL OR to_date IS NULL THEN
+        RETURN 0;
+    END IF;
+    IF to_date - from_date > 366 * 50 THEN
+        RAISE EXCEPTION 'refusing to create partitions for % .. %, check the dates in the data', from_date, to_date;
+    END IF;
+    SELECT n.nspname, c.relname INTO parent_schema, parent_name
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace WHERE c.oid = parent;
+    -- Two loaders adding the same month would otherwise race on CREATE TABLE
+    PERFORM pg_advisory_xact_lock(parent::oid::bigint);
+
+    month := date_trunc('month', from_date)::date;
+    WHILE month <= to_date LOOP
+        partition_name := parent_name || '_p' || to_char(month, 'YYYYMM');
+        -- Covered already, by its own partition or a wider one such as <table>_legacy
+        IF NOT EXISTS (SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid,
+                              regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \((.*)\) TO \((.*)\)') b
+                       WHERE i.inhparent = parent
+                         AND (b[1] = 'MINVALUE' OR month >= btrim(b[1], '''')::date)
+                         AND (b[2] = 'MAXVALUE' OR month < btrim(b[2], '''')::date)) THEN
+            IF to_regclass(format('%I.%I', parent_schema, partition_name)) IS NOT NULL THEN
+                RAISE EXCEPTION '% exists but is not attached to % (detached by retention?); drop or reattach it before loading that month',
+                                partition_name, parent;
+            END IF;
+            EXECUTE format('CREATE TABLE %I.%I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                           parent_schema, partition_name, parent, month, (month + interval '1 month')::date);
+            created := created + 1;
+        END IF;
+        month := (month + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Retention: detach the monthly partitions older than the last keep_months months.
+-- Detached partitions stay as ordinary tables (archive or DROP them); customer_features
+-- is not recomputed, so it keeps counting their bills until refresh_all_customer_features().
+CREATE OR REPLACE FUNCTION detach_monthly_partitions(parent REGCLASS, keep_months INTEGER) RETURNS SETOF TEXT AS $$
+DECLARE
+    parent_schema TEXT;
+    partition_name TEXT;
+    cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => keep_months))::date;
+BEGIN
+    SELECT n.nspname INTO parent_schema
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace WHERE c.oid = parent;
+    FOR partition_name IN
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent AND c.relname ~ '_p[0-9]{6}$'
+          AND to_date(right(c.relname, 6), 'YYYYMM') < cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE %s DETACH PARTITION %I.%I', parent, parent_schema, partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
 
 -- 6. Users Table (from my-react-app)
 CREATE TABLE users (
@@ -73,9 +161,25 @@ CREATE TABLE users (
     storeName VARCHAR(255),
     latitude DECIMAL(10, 8),
     longitude DECIMAL(11, 8),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP -- keyset pagination key, with id
 );
 
+-- Canonical form of an Indonesian phone number: digits only, 62 country prefix
+-- (0812-3456, +62 812 3456 and 8123456 all become 628123456)
+CREATE OR REPLACE FUNCTION normalize_phone(phone TEXT) RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN digits LIKE '0%' THEN '62' || substr(digits, 2)
+        WHEN digits LIKE '8%' THEN '62' || digits
+        ELSE digits
+    END
+    FROM (SELECT regexp_replace(phone, '[^0-9]', '', 'g') AS digits) d
+$$ LANGUAGE sql IMMUTABLE;
+
+-- One user per phone number, and an index for the lookup on every incoming message
+CREATE UNIQUE INDEX idx_users_phone_normalized ON users (normalize_phone(phone));
+-- Keyset pagination for the onboarding app's GET /api/users
+CREATE INDEX idx_users_created_at_id ON users (created_at DESC, id DESC);
+
 -- 7. Agents Table (Multi-Agent System)
 CREATE TABLE agents (
     agent_id SERIAL PRIMARY KEY,
@@ -146,3 +250,147 @@ CREATE TABLE msme_profiles (
 CREATE INDEX idx_agent_tasks_agent ON agent_tasks(agent_id);
 CREATE INDEX idx_agent_logs_agent ON agent_logs(agent_id);
 CREATE INDEX idx_msme_profiles_customer ON msme_profiles(customer_number);
+
+-- 13. Customer Features (Tiering model inputs, see README "Feature Engineering")
+-- One row per customer, kept current by statement-level triggers on loans and bills,
+-- so the ML engine reads features with a single primary-key lookup.
+CREATE TABLE customer_features (
+    customer_number VARCHAR(255) PRIMARY KEY REFERENCES customers(customer_number),
+    total_paid DECIMAL(18, 2),
+    total_bill DECIMAL(18, 2),
+    current_dpd INTEGER,
+    on_time_count INTEGER,
+    total_bills_count INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Recompute features for the given customers only. Concurrent writes for the same
+-- customer queue on its customers row (FOR NO KEY UPDATE does not block FK checks),
+-- so the later one aggregates with the earlier one's rows visible; the upsert then
+-- replaces the row instead of racing a delete + insert on the primary key.
+CREATE OR REPLACE FUNCTION refresh_customer_features(customer_numbers VARCHAR[]) RETURNS void AS $$
+BEGIN
+    PERFORM 1 FROM customers WHERE customer_number = ANY(customer_numbers)
+    ORDER BY customer_number FOR NO KEY UPDATE;
+    INSERT INTO customer_features (customer_number, total_paid, total_bill, current_dpd, on_time_count, total_bills_count)
+    SELECT l.customer_number,
+           COALESCE(SUM(b.paid_amount), 0),
+           COALESCE(SUM(b.amount), 0),
+           COALESCE(MAX(l.dpd), 0),
+           COUNT(*) FILTER (WHERE b.bill_paid_date <= b.bill_scheduled_date),
+           COUNT(b.bill_id)
+    FROM loans l
+    LEFT JOIN bills b ON b.loan_id = l.loan_id
+    WHERE l.customer_number = ANY(customer_numbers)
+    GROUP BY l.customer_number
+    ON CONFLICT (customer_number) DO UPDATE
+    SET total_paid = EXCLUDED.total_paid, total_bill = EXCLUDED.total_bill, current_dpd = EXCLUDED.current_dpd,
+        on_time_count = EXCLUDED.on_time_count, total_bills_count = EXCLUDED.total_bills_count,
+        updated_at = CURRENT_TIMESTAMP;
+    -- Customers whose last loan is gone
+    DELETE FROM customer_features f
+    WHERE f.customer_number = ANY(customer_numbers)
+      AND NOT EXISTS (SELECT 1 FROM loans l WHERE l.customer_number = f.customer_number);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Full rebuild, e.g. after restoring data with triggers bypassed
+CREATE OR REPLACE FUNCTION refresh_all_customer_features() RETURNS void AS $$
+BEGIN
+    PERFORM refresh_customer_features(ARRAY(SELECT DISTINCT customer_number FROM loans WHERE customer_number IS NOT NULL));
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION loans_refresh_customer_features() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_customer_features(ARRAY(SELECT DISTINCT customer_number FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_customer_features(ARRAY(SELECT DISTINCT customer_number FROM old_rows));
+    ELSE
+        PERFORM refresh_customer_features(ARRAY(
+            SELECT customer_number FROM new_rows UNION SELECT customer_number FROM old_rows));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bills_refresh_customer_features() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_customer_features(ARRAY(
+            SELECT DISTINCT l.customer_number FROM new_rows n JOIN loans l ON l.loan_id = n.loan_id));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_customer_features(ARRAY(
+            SELECT DISTINCT l.customer_number FROM old_rows o JOIN loans l ON l.loan_id = o.loan_id));
+    ELSE
+        PERFORM refresh_customer_features(ARRAY(
+            SELECT l.customer_number FROM new_rows n JOIN loans l ON l.loan_id = n.loan_id
+            UNION
+            SELECT l.customer_number FROM old_rows o JOIN loans l ON l.loan_id = o.loan_id));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables cannot be shared across events, hence one trigger per event
+CREATE TRIGGER trg_loans_features_insert AFTER INSERT ON loans
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION loans_refresh_customer_features();
+CREATE TRIGGER trg_loans_features_update AFTER UPDATE ON loans
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION loans_refresh_customer_features();
+CREATE TRIGGER trg_loans_features_delete AFTER DELETE ON loans
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION loans_refresh_customer_features();
+CREATE TRIGGER trg_bills_features_insert AFTER INSERT ON bills
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bills_refresh_customer_features();
+CREATE TRIGGER trg_bills_features_update AFTER UPDATE ON bills
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bills_refresh_customer_features();
+CREATE TRIGGER trg_bills_features_delete AFTER DELETE ON bills
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION bills_refresh_customer_features();
+
+-- 14. Webhook Events (durable ingestion queue for WAHA /webhook)
+-- Workers claim rows with FOR UPDATE SKIP LOCKED; at most one event per chat is
+-- 'processing' at a time, so messages from one chat are handled in arrival order.
+CREATE TABLE webhook_events (
+    id BIGSERIAL PRIMARY KEY,
+    chat_id VARCHAR(255),
+    message_id VARCHAR(255),
+    event VARCHAR(50),
+    payload JSONB,
+    status VARCHAR(20) DEFAULT 'pending', -- 'pending', 'processing', 'done', 'failed'
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+CREATE INDEX idx_webhook_events_active ON webhook_events(id) WHERE status IN ('pending', 'processing');
+CREATE INDEX idx_webhook_events_chat ON webhook_events(chat_id, id) WHERE status IN ('pending', 'processing');
+CREATE INDEX idx_webhook_events_processed ON webhook_events(processed_at) WHERE status = 'done';
+
+-- Message ids already accepted by POST /webhook (backend/webhook_queue.py), so a
+-- WAHA retry never triggers the Gemini extraction twice. One row per message id:
+-- a second consumer writing here would drop the messages the first one took.
+CREATE TABLE webhook_dedupe (
+    message_id VARCHAR(255) PRIMARY KEY,
+    source VARCHAR(50), -- 'backend', 'n8n'
+    seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_webhook_dedupe_seen ON webhook_dedupe(seen_at);
+
+-- 15. Extraction Cache (Gemini results for note / receipt photos, see backend/extraction.py)
+CREATE TABLE extraction_cache (
+    content_hash CHAR(64) PRIMARY KEY, -- sha256 of the image bytes
+    phash BIGINT, -- 64-bit dHash, matched by Hamming distance
+    version INTEGER,
+    result JSONB,
+    hits INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    scope VARCHAR(255) -- chat/user that sent the image; near matches stay within it
+);
+
+CREATE INDEX idx_extraction_cache_last_hit ON extraction_cache(last_hit_at);
+CREATE INDEX idx_extraction_cache_scope ON extraction_cache(scope, created_at) WHERE scope IS NOT NULL;
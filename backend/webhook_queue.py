@@ -0,0 +1,262 @@
+"""
+Durable ingestion queue for WAHA webhooks.
+
+/webhook only inserts the event into webhook_events and returns. A pool of
+async workers claims pending events with FOR UPDATE SKIP LOCKED and runs the
+handler (Gemini extraction, tiering, replies). An event is claimed only when
+its chat has nothing older pending and nothing in flight, which keeps per-chat
+order while different chats are processed in parallel.
+"""
+import asyncio
+import json
+import os
+import time
+
+from cache import TTLCache
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_MAX = int(os.getenv("WEBHOOK_QUEUE_MAX", "10000"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1"))
+# Events stuck in 'processing' longer than this (crashed worker) go back to pending
+WEBHOOK_LOCK_TIMEOUT = int(os.getenv("WEBHOOK_LOCK_TIMEOUT", "300"))
+# Finished events are kept this long, then purged
+WEBHOOK_RETENTION_HOURS = int(os.getenv("WEBHOOK_RETENTION_HOURS", "24"))
+# Dedupe window: recent ids in memory, older ones in webhook_dedupe
+WEBHOOK_DEDUPE_CACHE_SIZE = int(os.getenv("WEBHOOK_DEDUPE_CACHE_SIZE", "100000"))
+WEBHOOK_DEDUPE_DAYS = int(os.getenv("WEBHOOK_DEDUPE_DAYS", "7"))
+
+# Events that describe the same incoming message (WAHA sends both for one id)
+MESSAGE_EVENTS = ("message", "message.any")
+
+# Claims the dedupe key and enqueues in one statement; returns no row for a duplicate
+ENQUEUE_EVENT = """
+    WITH claimed AS (
+        INSERT INTO webhook_dedupe (message_id, source)
+        SELECT $5::varchar, 'backend' WHERE $5::varchar IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING message_id
+    )
+    INSERT INTO webhook_events (chat_id, message_id, event, payload)
+    SELECT $1, $2, $3, $4::jsonb
+    WHERE $5::varchar IS NULL OR EXISTS (SELECT 1 FROM claimed)
+    RETURNING id
+"""
+
+CLAIM_EVENT = """
+    UPDATE webhook_events
+    SET status = 'processing', locked_at = now(), attempts = attempts + 1
+    WHERE id = (
+        SELECT e.id FROM webhook_events e
+        WHERE e.status = 'pending'
+          AND e.available_at <= now()
+          AND NOT EXISTS (
+              SELECT 1 FROM webhook_events p
+              WHERE p.chat_id = e.chat_id AND p.status = 'processing')
+          AND NOT EXISTS (
+              SELECT 1 FROM webhook_events o
+              WHERE o.chat_id = e.chat_id AND o.status = 'pending' AND o.id < e.id)
+        ORDER BY e.id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, chat_id, message_id, event, payload, attempts
+"""
+
+COMPLETE_EVENT = """
+    UPDATE webhook_events SET status = 'done', processed_at = now(), last_error = NULL
+    WHERE id = $1
+    RETURNING EXTRACT(EPOCH FROM processed_at - received_at)
+"""
+
+# Failed attempts go back to pending with linear backoff, or to 'failed' once exhausted
+FAIL_EVENT = """
+    UPDATE webhook_events
+    SET status = CASE WHEN attempts >= $3 THEN 'failed' ELSE 'pending' END,
+        available_at = now() + make_interval(secs => attempts * 5),
+        last_error = $2,
+        locked_at = NULL
+    WHERE id = $1
+"""
+
+RELEASE_STALE = """
+    UPDATE webhook_events SET status = 'pending', locked_at = NULL
+    WHERE status = 'processing' AND locked_at < now() - make_interval(secs => $1)
+"""
+
+PURGE_DONE = "DELETE FROM webhook_events WHERE status = 'done' AND processed_at < now() - make_interval(hours => $1)"
+PURGE_DEDUPE = "DELETE FROM webhook_dedupe WHERE seen_at < now() - make_interval(days => $1)"
+
+QUEUE_METRICS = """
+    SELECT count(*) FILTER (WHERE status = 'pending') AS pending,
+           count(*) FILTER (WHERE status = 'processing') AS processing,
+           EXTRACT(EPOCH FROM now() - min(received_at) FILTER (WHERE status = 'pending')) AS oldest_pending_seconds
+    FROM webhook_events
+    WHERE status IN ('pending', 'processing')
+"""
+
+FAILED_COUNT = "SELECT count(*) FROM webhook_events WHERE status = 'failed'"
+
+class QueueFull(Exception):
+    pass
+
+def event_keys(data):
+    """(chat_id, message_id, event) of a WAHA webhook body."""
+    payload = data.get("payload") or {}
+    if payload.get("fromMe"):
+        chat_id = payload.get("to")
+    else:
+        chat_id = payload.get("from")
+    return (chat_id or data.get("session") or "system", payload.get("id"), data.get("event"))
+
+def dedupe_key(data):
+    """Key identifying a delivery: the message id for message events, event:id for the rest (acks, etc.)."""
+    _, message_id, event = event_keys(data)
+    if not message_id:
+        return None
+    return message_id if event in MESSAGE_EVENTS else f"{event}:{message_id}"
+
+class WebhookQueue:
+    def __init__(self, db, handler, workers=WEBHOOK_WORKERS, max_depth=WEBHOOK_QUEUE_MAX):
+        self.db = db
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.depth = 0
+        self.processed = 0
+        self.failures = 0
+        self.rejected = 0
+        self.duplicates_memory = 0
+        self.duplicates_db = 0
+        self.seen = TTLCache(WEBHOOK_DEDUPE_CACHE_SIZE, WEBHOOK_DEDUPE_DAYS * 86400)
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    async def start(self):
+        await self.refresh_depth()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._housekeeping()))
+        print(f"Webhook queue started with {self.workers} workers ({self.depth} pending)")
+
+    async def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def refresh_depth(self):
+        async with self.db.connection() as conn:
+            row = await conn.fetchrow(QUEUE_METRICS)
+        self.depth = row["pending"] + row["processing"]
+        return row
+
+    async def enqueue(self, data):
+        """
+        Persist one webhook body. Returns the event id, or None for a delivery
+        already accepted. Raises QueueFull when the backlog is at capacity.
+        """
+        key = dedupe_key(data)
+        if key is not None and self.seen.get(key):
+            self.duplicates_memory += 1
+            return None
+
+        # depth is refreshed by the housekeeping loop, so admission costs no query
+        if self.depth >= self.max_depth:
+            self.rejected += 1
+            raise QueueFull(f"webhook queue is full ({self.depth} events)")
+
+        chat_id, message_id, event = event_keys(data)
+        async with self.db.connection() as conn:
+            event_id = await conn.fetchval(ENQUEUE_EVENT, chat_id, message_id, event, json.dumps(data), key)
+        if key is not None:
+            self.seen.set(key, True)
+        if event_id is None:
+            self.duplicates_db += 1
+            return None
+        self.depth += 1
+        self._wakeup.set()
+        return event_id
+
+    async def _claim(self):
+        async with self.db.connection() as conn:
+            return await conn.fetchrow(CLAIM_EVENT)
+
+    async def _worker(self, n):
+        while not self._stopping:
+            try:
+                row = await self._claim()
+            except Exception as e:
+                print(f"Webhook worker {n}: claim failed: {e}")
+                await asyncio.sleep(WEBHOOK_POLL_INTERVAL)
+                continue
+
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), WEBHOOK_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._process(row)
+
+    async def _process(self, row):
+        try:
+            await self.handler(json.loads(row["payload"]))
+        except Exception as e:
+            self.failures += 1
+            print(f"Webhook event {row['id']} failed (attempt {row['attempts']}): {e}")
+            async with self.db.connection() as conn:
+                await conn.execute(FAIL_EVENT, row["id"], str(e), WEBHOOK_MAX_ATTEMPTS)
+            return
+
+        async with self.db.connection() as conn:
+            lag = float(await conn.fetchval(COMPLETE_EVENT, row["id"]) or 0)
+        self.processed += 1
+        self.depth = max(self.depth - 1, 0)
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+        # The chat may have a next event waiting on this one
+        self._wakeup.set()
+
+    async def _housekeeping(self):
+        """Refresh the depth estimate, release stale locks and purge old events."""
+        last_purge = 0.0
+        while not self._stopping:
+            try:
+                await self.refresh_depth()
+                async with self.db.connection() as conn:
+                    await conn.execute(RELEASE_STALE, WEBHOOK_LOCK_TIMEOUT)
+                    if time.monotonic() - last_purge > 3600:
+                        await conn.execute(PURGE_DONE, WEBHOOK_RETENTION_HOURS)
+                        await conn.execute(PURGE_DEDUPE, WEBHOOK_DEDUPE_DAYS)
+                        last_purge = time.monotonic()
+            except Exception as e:
+                print(f"Webhook housekeeping failed: {e}")
+            await asyncio.sleep(5)
+
+    async def metrics(self):
+        row = await self.refresh_depth()
+        async with self.db.connection() as conn:
+            failed = await conn.fetchval(FAILED_COUNT)
+        return {
+            "workers": self.workers,
+            "max_depth": self.max_depth,
+            "pending": row["pending"],
+            "processing": row["processing"],
+            "failed": failed,
+            "oldest_pending_seconds": round(float(row["oldest_pending_seconds"] or 0), 3),
+            "processed": self.processed,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "duplicates_memory": self.duplicates_memory,
+            "duplicates_db": self.duplicates_db,
+            "dedupe_cache": self.seen.stats(),
+            "lag_avg_seconds": round(self.lag_total / self.processed, 3) if self.processed else 0.0,
+            "lag_max_seconds": round(self.lag_max, 3)
+        }
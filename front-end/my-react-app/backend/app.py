@@ -1,18 +1,21 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from database import init_db, create_user, get_all_users, check_user_exists
+from database import check_schema_version, create_user, get_users_page, stream_users, check_user_exists, pool_stats
+import json
 import psycopg2
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize database on startup
+USERS_PAGE_DEFAULT = 100
+USERS_PAGE_MAX = 1000
+
+# Schema changes are applied out-of-band by backend/migrate.py; startup only checks the version
 try:
-    init_db()
-    print("Database initialized successfully")
+    print(f"Database schema v{check_schema_version()}")
 except Exception as e:
-    print(f"Warning: Could not initialize database: {e}")
-    print("Make sure PostgreSQL is running and credentials are correct in .env file")
+    print(f"Warning: Could not verify database schema: {e}")
+    print("Make sure PostgreSQL is running, credentials are correct in .env file and migrations have been applied")
 
 @app.route('/api/users', methods=['POST'])
 def add_user():
@@ -79,30 +82,81 @@ def check_phone(phone):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def serialize_user(user):
+    """Row -> JSON-safe dict (created_at as ISO string)."""
+    user_dict = dict(user)
+    if user_dict.get('created_at'):
+        user_dict['created_at'] = user_dict['created_at'].isoformat()
+    return user_dict
+
 @app.route('/api/users', methods=['GET'])
 def list_users():
-    """Get all users."""
-    try:
-        users = get_all_users()
+    """
+    List users, newest first, one page at a time: ?limit=100&cursor=<next_cursor>.
+    With ?format=ndjson (or Accept: application/x-ndjson) every user is
+    streamed as one JSON object per line instead. Without limit or cursor the
+    response is the same as before paging existed ({message, data} with every
+    user), streamed from a server-side cursor so memory stays flat. Streams
+    fetch their first batch before responding, so a database error still
+    returns a JSON error with status 500.
+    """
+    ndjson = request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', '')
+    if ndjson or ('limit' not in request.args and 'cursor' not in request.args):
+        try:
+            users = stream_users()
+            first = next(users, None)
+        except psycopg2.Error as e:
+            return jsonify({'error': f'Database error: {str(e)}'}), 500
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
         
-        # Convert datetime objects to strings for JSON serialization
-        users_list = []
-        for user in users:
-            user_dict = dict(user)
-            if user_dict.get('created_at'):
-                user_dict['created_at'] = user_dict['created_at'].isoformat()
-            users_list.append(user_dict)
+        def all_users():
+            try:
+                if first is not None:
+                    yield first
+                    yield from users
+            finally:
+                users.close()
+        
+        if ndjson:
+            def rows():
+                for user in all_users():
+                    yield json.dumps(serialize_user(user)) + '\n'
+            return Response(stream_with_context(rows()), mimetype='application/x-ndjson')
+        
+        def body():
+            yield '{"message": "success", "data": ['
+            for i, user in enumerate(all_users()):
+                yield (', ' if i else '') + json.dumps(serialize_user(user))
+            yield ']}'
+        return Response(stream_with_context(body()), mimetype='application/json')
+    
+    try:
+        limit = min(max(int(request.args.get('limit', USERS_PAGE_DEFAULT)), 1), USERS_PAGE_MAX)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    try:
+        users, next_cursor = get_users_page(limit, request.args.get('cursor'))
         
         return jsonify({
             'message': 'success',
-            'data': users_list
+            'data': [serialize_user(user) for user in users],
+            'next_cursor': next_cursor
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except psycopg2.Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/db/pool', methods=['GET'])
+def db_pool():
+    """Connection pool size and wait/usage metrics."""
+    return jsonify(pool_stats()), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
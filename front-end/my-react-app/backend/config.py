@@ -9,6 +9,17 @@ class Config:
     DB_NAME = os.getenv('DB_NAME', 'arthiusaha')
     DB_USER = os.getenv('DB_USER', 'postgres')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
+    # Connection pool: size limits, how long a request may wait for a free
+    # connection, and how long a connection may sit idle before checkout pings it.
+    # psycopg2 keeps at most DB_POOL_MIN idle connections and closes extra ones on return,
+    # so DB_POOL_MIN defaults to DB_POOL_MAX: every connection stays open between bursts.
+    # A lower DB_POOL_MIN holds fewer idle server connections but reconnects on each burst.
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+    DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', str(DB_POOL_MAX)))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+    DB_POOL_HEALTHCHECK_IDLE = float(os.getenv('DB_POOL_HEALTHCHECK_IDLE', '30'))
+    # Oldest schema_version (backend/migrate.py) this app works with
+    REQUIRED_SCHEMA_VERSION = int(os.getenv('REQUIRED_SCHEMA_VERSION', '9'))
     
     @staticmethod
     def get_db_config():
@@ -1,137 +1,256 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from contextlib import contextmanager
+
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from config import Config
 
-def get_connection():
-    """Create and return a database connection."""
-    try:
-        conn = psycopg2.connect(**Config.get_db_config())
-        return conn
-    except psycopg2.Error as e:
-        print(f"Error connecting to database: {e}")
-        raise
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises instead of waiting when it is exhausted;
+# the semaphore makes callers queue for up to DB_POOL_TIMEOUT instead
+_slots = threading.BoundedSemaphore(Config.DB_POOL_MAX)
+_last_used = {}
+_stats = {
+    'checkouts': 0,
+    'waits': 0,
+    'wait_ms_total': 0.0,
+    'wait_ms_max': 0.0,
+    'timeouts': 0,
+    'in_use': 0,
+    'peak_in_use': 0,
+    'reconnects': 0
+}
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+def get_pool():
+    """Create the process-wide connection pool on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(min(Config.DB_POOL_MIN, Config.DB_POOL_MAX), Config.DB_POOL_MAX,
+                                               **Config.get_db_config())
+    return _pool
+
+def _checkout(pool):
+    """Take a connection from the pool, skipping ones that have gone away."""
+    while True:
+        conn = pool.getconn()
+        last_used = _last_used.get(id(conn))
+        # Freshly opened, or used recently enough to trust without a ping
+        if last_used is None or (not conn.closed and time.monotonic() - last_used < Config.DB_POOL_HEALTHCHECK_IDLE):
+            return conn
+        try:
+            if conn.closed:
+                raise psycopg2.InterfaceError('connection already closed')
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return conn
+        except psycopg2.Error:
+            # Server restarted or dropped the idle connection; try the next one
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            with _pool_lock:
+                _stats['reconnects'] += 1
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection; rolls back on error and returns it afterwards."""
+    pool = get_pool()
+    start = time.monotonic()
+    if not _slots.acquire(blocking=False):
+        waited = _slots.acquire(timeout=Config.DB_POOL_TIMEOUT)
+        wait_ms = (time.monotonic() - start) * 1000
+        with _pool_lock:
+            _stats['waits'] += 1
+            _stats['wait_ms_total'] += wait_ms
+            _stats['wait_ms_max'] = max(_stats['wait_ms_max'], wait_ms)
+            if not waited:
+                _stats['timeouts'] += 1
+        if not waited:
+            raise PoolTimeout(f'no database connection free after {Config.DB_POOL_TIMEOUT}s')
 
-def init_db():
-    """Initialize the database and create tables if they don't exist."""
     conn = None
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        
-        # Create users table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                firstName VARCHAR(100),
-                lastName VARCHAR(100),
-                phone VARCHAR(20),
-                customerEmail VARCHAR(255),
-                location VARCHAR(255),
-                storeName VARCHAR(255),
-                latitude DECIMAL(10, 8),
-                longitude DECIMAL(11, 8),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Add columns if they don't exist (for existing tables)
-        cur.execute("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='users' AND column_name='latitude') THEN
-                    ALTER TABLE users ADD COLUMN latitude DECIMAL(10, 8);
-                END IF;
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='users' AND column_name='longitude') THEN
-                    ALTER TABLE users ADD COLUMN longitude DECIMAL(11, 8);
-                END IF;
-            END $$;
-        """)
-        
-        conn.commit()
-        print("Database initialized successfully")
-        
-    except psycopg2.Error as e:
-        print(f"Error initializing database: {e}")
-        if conn:
-            conn.rollback()
-        raise
+        conn = _checkout(pool)
+        with _pool_lock:
+            _stats['checkouts'] += 1
+            _stats['in_use'] += 1
+            _stats['peak_in_use'] = max(_stats['peak_in_use'], _stats['in_use'])
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            with _pool_lock:
+                _stats['in_use'] -= 1
     finally:
-        if conn:
-            cur.close()
-            conn.close()
+        if conn is not None:
+            pool.putconn(conn, close=bool(conn.closed))
+            if conn.closed:
+                _last_used.pop(id(conn), None)
+            else:
+                _last_used[id(conn)] = time.monotonic()
+        _slots.release()
+
+def pool_stats():
+    """Pool size and wait/usage counters for /api/db/pool."""
+    with _pool_lock:
+        stats = dict(_stats)
+    stats['wait_ms_avg'] = round(stats['wait_ms_total'] / stats['waits'], 2) if stats['waits'] else 0.0
+    stats['wait_ms_total'] = round(stats['wait_ms_total'], 2)
+    stats['wait_ms_max'] = round(stats['wait_ms_max'], 2)
+    return {
+        'min': min(Config.DB_POOL_MIN, Config.DB_POOL_MAX),
+        'max': Config.DB_POOL_MAX,
+        'timeout': Config.DB_POOL_TIMEOUT,
+        'open': len(_pool._pool) + len(_pool._used) if _pool else 0,
+        'idle': len(_pool._pool) if _pool else 0,
+        **stats
+    }
+
+class SchemaOutdated(Exception):
+    pass
+
+def check_schema_version():
+    """
+    Make sure backend/migrate.py has brought the database far enough for this
+    app. Only reads schema_version, so it is cheap and takes no DDL locks.
+    """
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+        version = None
+        if cur.fetchone()[0]:
+            cur.execute("SELECT max(version) FROM schema_version")
+            version = cur.fetchone()[0]
+    
+    if version is None or version < Config.REQUIRED_SCHEMA_VERSION:
+        raise SchemaOutdated(
+            f"database schema is at v{version or 0}, this app needs v{Config.REQUIRED_SCHEMA_VERSION}; "
+            "run `python backend/migrate.py`"
+        )
+    return version
 
 def create_user(user_data):
-    """Insert a new user into the database."""
-    conn = None
+    """
+    Insert a new user into the database. If another request registered the same
+    phone number (in any spelling) first, returns that user's id instead.
+    """
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            INSERT INTO users (firstName, lastName, phone, customerEmail, location, storeName, latitude, longitude)
-            VALUES (%(firstName)s, %(lastName)s, %(phone)s, %(customerEmail)s, %(location)s, %(storeName)s, %(latitude)s, %(longitude)s)
-            RETURNING id
-        """, user_data)
-        
-        user_id = cur.fetchone()[0]
-        conn.commit()
-        return user_id
+        with connection() as conn, conn.cursor() as cur:
+            # normalize_phone() matches the unique expression index in backend/schema.sql
+            cur.execute("""
+                INSERT INTO users (firstName, lastName, phone, customerEmail, location, storeName, latitude, longitude)
+                VALUES (%(firstName)s, %(lastName)s, %(phone)s, %(customerEmail)s, %(location)s, %(storeName)s, %(latitude)s, %(longitude)s)
+                ON CONFLICT ((normalize_phone(phone))) DO NOTHING
+                RETURNING id
+            """, user_data)
+            
+            row = cur.fetchone()
+            if row is None:
+                cur.execute("SELECT id FROM users WHERE normalize_phone(phone) = normalize_phone(%(phone)s)", user_data)
+                row = cur.fetchone()
+            conn.commit()
+            return row[0]
         
     except psycopg2.Error as e:
         print(f"Error creating user: {e}")
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 def check_user_exists(phone):
-    """Check if a user with the given phone already exists."""
-    conn = None
+    """Check if a user with the given phone already exists, however it is written."""
     try:
-        conn = get_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        cur.execute("""
-            SELECT id, firstName, lastName, phone, customerEmail, location, storeName, created_at
-            FROM users
-            WHERE phone = %s
-            LIMIT 1
-        """, (phone,))
-        
-        user = cur.fetchone()
-        return user
+        with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id, firstName, lastName, phone, customerEmail, location, storeName, created_at
+                FROM users
+                WHERE normalize_phone(phone) = normalize_phone(%s)
+                LIMIT 1
+            """, (phone,))
+            
+            user = cur.fetchone()
+            return user
         
     except psycopg2.Error as e:
         print(f"Error checking user existence: {e}")
         raise
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
-def get_all_users():
-    """Retrieve all users from the database."""
-    conn = None
+USER_COLUMNS = "id, firstName, lastName, phone, customerEmail, location, storeName, created_at"
+
+def encode_cursor(row):
+    """Opaque page cursor for the (created_at, id) of the last row on a page."""
+    raw = json.dumps([row['created_at'].isoformat(), row['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything malformed."""
     try:
-        conn = get_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        cur.execute("""
-            SELECT id, firstName, lastName, phone, customerEmail, location, storeName, created_at
-            FROM users
-            ORDER BY created_at DESC
-        """)
-        
-        users = cur.fetchall()
-        return users
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(user_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+def get_users_page(limit=100, cursor=None):
+    """
+    One page of users, newest first, as (users, next_cursor).
+    Uses keyset pagination on (created_at, id), so every page is an index
+    range scan no matter how deep it is; next_cursor is None on the last page.
+    """
+    try:
+        with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if cursor:
+                created_at, user_id = decode_cursor(cursor)
+                cur.execute(f"""
+                    SELECT {USER_COLUMNS}
+                    FROM users
+                    WHERE (created_at, id) < (%s, %s)
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                """, (created_at, user_id, limit + 1))
+            else:
+                cur.execute(f"""
+                    SELECT {USER_COLUMNS}
+                    FROM users
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                """, (limit + 1,))
+            
+            users = cur.fetchall()
+            next_cursor = encode_cursor(users[limit - 1]) if len(users) > limit else None
+            return users[:limit], next_cursor
         
     except psycopg2.Error as e:
         print(f"Error fetching users: {e}")
         raise
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
+
+def stream_users(batch_size=1000):
+    """
+    Yield every user, newest first, through a server-side cursor that fetches
+    batch_size rows at a time, so memory stays flat however big the table is.
+    The pooled connection is held until the generator is exhausted or closed.
+    """
+    try:
+        with connection() as conn, conn.cursor(name='users_export', cursor_factory=RealDictCursor) as cur:
+            cur.itersize = batch_size
+            cur.execute(f"""
+                SELECT {USER_COLUMNS}
+                FROM users
+                ORDER BY created_at DESC, id DESC
+            """)
+            for user in cur:
+                yield user
+        
+    except psycopg2.Error as e:
+        print(f"Error streaming users: {e}")
+        raise
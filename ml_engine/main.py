@@ -1,23 +1,40 @@
 from flask import Flask, request, jsonify
+import io
+import json
+import os
+import threading
 import pandas as pd
 import numpy as np
-# import tensorflow as tf
-# import pickle
+from model_registry import ModelRegistry
 
 app = Flask(__name__)
 
-# Load models here (mocking for now)
-# model = tf.keras.models.load_model('model.h5')
-# scaler = pickle.load(open('scaler.pkl', 'rb'))
+# Trained pipeline + label encoder, loaded on first use (see model_registry.py)
+registry = ModelRegistry()
+if os.getenv('PRELOAD_MODEL') == '1':
+    registry.preload()
 
 @app.route('/predict_tier', methods=['POST'])
 def predict_tier():
     try:
         data = request.json
+
+        # Use the trained model when it is loaded and the payload carries all of its features
+        loaded = registry.get()
+        if loaded and loaded.features and all(k in data for k in loaded.features):
+            X = pd.DataFrame([{k: data[k] for k in loaded.features}])
+            proba = loaded.model.predict_proba(X)[0]
+            tier = str(loaded.encoder.inverse_transform([int(np.argmax(proba))])[0])
+            return jsonify({
+                "tier": tier,
+                "score": round(float(np.max(proba)), 4),
+                "model_version": loaded.version,
+                "recommendation": f"Maintain positive cashflow to upgrade from {tier}."
+            })
+
         # Example input: {"income": 5000000, "expense": 3000000, "cashflow": 2000000}
         
         # Mock Logic for Tiering
-        # In real implementation, use the loaded model
         cashflow = data.get('cashflow', 0)
         
         if cashflow > 10000000:
@@ -36,5 +53,160 @@ def predict_tier():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Columns accepted by /predict_tier/batch (see README "Tiering Logic")
+TIER_FEATURES = ['total_paid', 'total_bill', 'current_dpd', 'on_time_count', 'total_bills_count']
+
+def calculate_tiers(total_paid, total_bill, current_dpd, on_time_count, total_bills_count):
+    """
+    Vectorized README tiering rules over NumPy arrays.
+
+    GOLD: DPD = 0 and repayment rate >= 98%. SILVER: DPD <= 7 and rate >= 90%.
+    BRONZE otherwise. Returns (tiers, repayment_rate, on_time_ratio).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        repayment_rate = np.where(total_bill > 0, total_paid / total_bill, 0.0)
+        on_time_ratio = np.where(total_bills_count > 0, on_time_count / total_bills_count, 0.0)
+
+    tiers = np.select(
+        [(current_dpd == 0) & (repayment_rate >= 0.98), (current_dpd <= 7) & (repayment_rate >= 0.90)],
+        ['Gold', 'Silver'],
+        default='Bronze'
+    )
+    return tiers, repayment_rate, on_time_ratio
+
+def read_batch():
+    """
+    Parse a batch request body into {feature: float array}.
+
+    Accepts NDJSON (application/x-ndjson), a NumPy .npz archive of named arrays
+    (application/x-npz), or JSON as either a list of records or a dict of columns
+    (a scalar counts as a column of one). Missing features, missing fields and
+    nulls become NaN in every format; predict_tier_batch reports those records
+    instead of scoring them.
+    """
+    content_type = (request.content_type or '').split(';')[0].strip()
+    if content_type == 'application/x-npz':
+        with np.load(io.BytesIO(request.get_data()), allow_pickle=False) as archive:
+            columns = {k: archive[k] for k in archive.files}
+    elif content_type == 'application/x-ndjson':
+        lines = request.get_data(as_text=True).splitlines()
+        columns = pd.DataFrame([json.loads(line) for line in lines if line.strip()])
+    else:
+        payload = request.get_json(force=True)
+        columns = pd.DataFrame(payload) if isinstance(payload, list) else payload
+    if not isinstance(columns, (dict, pd.DataFrame)):
+        raise ValueError('expected a list of records or a dict of columns')
+
+    arrays = {k: np.atleast_1d(np.asarray(columns[k], dtype=float)) for k in TIER_FEATURES if k in columns}
+    lengths = {len(v) for v in arrays.values()}
+    if len(lengths) > 1:
+        raise ValueError('all feature columns must have the same length')
+    n = len(columns) if isinstance(columns, pd.DataFrame) else (lengths.pop() if lengths else 0)
+    return {k: arrays.get(k, np.full(n, np.nan)) for k in TIER_FEATURES}
+
+def missing_features(features):
+    """[(index, [missing feature, ...])] for records with a missing or non-finite feature."""
+    finite = {k: np.isfinite(v) for k, v in features.items()}
+    invalid = ~np.logical_and.reduce(list(finite.values()))
+    return [(int(i), [k for k in TIER_FEATURES if not finite[k][i]]) for i in np.flatnonzero(invalid)]
+
+@app.route('/predict_tier/batch', methods=['POST'])
+def predict_tier_batch():
+    """
+    Score many records in one request; results keep the input order. Records
+    missing a feature get null results and are listed under "invalid" rather
+    than being scored as if the feature were 0.
+    """
+    try:
+        features = read_batch()
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        tiers, repayment_rate, on_time_ratio = calculate_tiers(**features)
+        tiers = tiers.astype(object)
+        repayment_rate = np.round(repayment_rate, 4).astype(object)
+        on_time_ratio = np.round(on_time_ratio, 4).astype(object)
+        invalid = missing_features(features)
+        for i, _ in invalid:
+            tiers[i] = repayment_rate[i] = on_time_ratio[i] = None
+        return jsonify({
+            "count": len(tiers),
+            "tier": tiers.tolist(),
+            "repayment_rate": repayment_rate.tolist(),
+            "on_time_ratio": on_time_ratio.tolist(),
+            "invalid": [{"index": i, "missing": missing} for i, missing in invalid]
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# customer_features is maintained by triggers in backend/schema.sql
+DATABASE_URL = os.getenv('DATABASE_URL')
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Create the Postgres connection pool on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+                _pool = ThreadedConnectionPool(1, int(os.getenv('DB_POOL_SIZE', '5')), DATABASE_URL)
+    return _pool
+
+def fetch_customer_features(customer_number):
+    """Read one customer's materialized features by primary key, or None."""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT {', '.join(TIER_FEATURES)} FROM customer_features WHERE customer_number = %s",
+                (customer_number,)
+            )
+            row = cur.fetchone()
+        conn.rollback()
+    finally:
+        pool.putconn(conn)
+    return None if row is None else dict(zip(TIER_FEATURES, row))
+
+@app.route('/predict_tier/customer/<customer_number>', methods=['GET'])
+def predict_tier_customer(customer_number):
+    """Score a customer from the customer_features table."""
+    try:
+        features = fetch_customer_features(customer_number)
+        if features is None:
+            return jsonify({"error": f"no features for customer {customer_number}"}), 404
+
+        tiers, repayment_rate, on_time_ratio = calculate_tiers(
+            **{k: np.array([float(v)]) for k, v in features.items()}
+        )
+        return jsonify({
+            "customer_number": customer_number,
+            "tier": tiers[0],
+            "repayment_rate": round(float(repayment_rate[0]), 4),
+            "on_time_ratio": round(float(on_time_ratio[0]), 4),
+            "features": {k: float(v) for k, v in features.items()}
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/model/status', methods=['GET'])
+def model_status():
+    """Version, load time and reload count of the model in this worker."""
+    return jsonify(registry.status())
+
+@app.route('/model/reload', methods=['POST'])
+def model_reload():
+    """Load the artifacts on disk now; requests in flight keep the old version."""
+    try:
+        loaded = registry.reload()
+        return jsonify({"version": loaded.version, "load_seconds": loaded.load_seconds})
+    except Exception as e:
+        return jsonify({"error": str(e), "version": registry.status()["version"]}), 500
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,148 @@
+"""
+Model registry for the ML engine.
+
+Loads the trained tier pipeline (best_model.pkl) and label encoder
+(label_encoder.pkl) lazily, once per process, and swaps to a new version when
+the artifacts on disk change. Requests always score against a complete
+snapshot; a failed reload keeps serving the previous one. If the first load
+fails, get() returns None and retries with exponential backoff, so callers can
+fall back to the rule-based tiers instead of failing every request.
+"""
+import gc
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+
+MODEL_DIR = os.getenv('MODEL_DIR', os.path.dirname(os.path.abspath(__file__)))
+MODEL_FILE = os.getenv('MODEL_FILE', 'best_model.pkl')
+ENCODER_FILE = os.getenv('ENCODER_FILE', 'label_encoder.pkl')
+# Seconds between on-disk change checks; 0 disables automatic reload
+RELOAD_INTERVAL = float(os.getenv('MODEL_RELOAD_INTERVAL', '30'))
+# Backoff between attempts while no model could be loaded yet: doubles from 1s up to this
+LOAD_RETRY_MAX = float(os.getenv('MODEL_LOAD_RETRY_MAX', '60'))
+
+# Immutable, so swapping self._current is the only state change a reader can observe
+LoadedModel = namedtuple('LoadedModel', 'version model encoder features loaded_at load_seconds signature')
+
+class ModelRegistry:
+    def __init__(self, model_dir=MODEL_DIR, model_file=MODEL_FILE, encoder_file=ENCODER_FILE,
+                 reload_interval=RELOAD_INTERVAL):
+        self.model_path = os.path.join(model_dir, model_file)
+        self.encoder_path = os.path.join(model_dir, encoder_file)
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self.last_error = None
+        self._current = None
+        self._lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._load_failures = 0
+        self._retry_at = 0.0
+
+    def _signature(self):
+        """Cheap change detector: (mtime, size) of both artifacts."""
+        return tuple((st.st_mtime_ns, st.st_size) for st in map(os.stat, (self.model_path, self.encoder_path)))
+
+    def _load(self):
+        start = time.perf_counter()
+        signature = self._signature()
+        with open(self.model_path, 'rb') as f:
+            model_bytes = f.read()
+        with open(self.encoder_path, 'rb') as f:
+            encoder_bytes = f.read()
+
+        model = pickle.loads(model_bytes)
+        encoder = pickle.loads(encoder_bytes)
+        features = [str(c) for c in getattr(model, 'feature_names_in_', [])]
+        version = hashlib.sha256(model_bytes + encoder_bytes).hexdigest()[:12]
+        return LoadedModel(version, model, encoder, features, time.time(),
+                           round(time.perf_counter() - start, 4), signature)
+
+    def get(self):
+        """
+        Return the current snapshot, loading it on first use. Returns None while
+        the artifacts cannot be loaded; last_error says why.
+        """
+        current = self._current
+        if current is None:
+            if time.monotonic() < self._retry_at:
+                return None
+            with self._lock:
+                if self._current is None and time.monotonic() >= self._retry_at:
+                    self._first_load()
+                current = self._current
+        elif self.reload_interval and time.monotonic() - self._last_check >= self.reload_interval:
+            self._check_for_update()
+            current = self._current
+        return current
+
+    def _first_load(self):
+        try:
+            self._current = self._load()
+            self._load_failures = 0
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            self._load_failures += 1
+            delay = min(2 ** (self._load_failures - 1), LOAD_RETRY_MAX)
+            self._retry_at = time.monotonic() + delay
+            print(f"Model load failed, using rule-based tiers; retrying in {delay:g}s: {e}")
+
+    def _check_for_update(self):
+        # Only one request per process does the check; the rest keep scoring on the old snapshot
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._last_check = time.monotonic()
+            if self._signature() != self._current.signature:
+                self._swap()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Model reload failed, keeping version {self._current.version}: {e}")
+        finally:
+            self._lock.release()
+
+    def _swap(self):
+        loaded = self._load()
+        if self._current is not None and loaded.version == self._current.version:
+            return self._current
+        self._current = loaded
+        self.reloads += 1
+        self.last_error = None
+        print(f"Loaded model version {loaded.version} in {loaded.load_seconds}s")
+        return loaded
+
+    def reload(self):
+        """Load the artifacts now and swap them in. Raises if loading fails."""
+        with self._lock:
+            try:
+                return self._swap()
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+
+    def preload(self):
+        """
+        Load before forking workers (gunicorn --preload) so they share the model
+        pages copy-on-write. gc.freeze() keeps the collector from touching them.
+        """
+        self.get()
+        gc.freeze()
+
+    def status(self):
+        current = self._current
+        return {
+            "loaded": current is not None,
+            "version": current.version if current else None,
+            "loaded_at": current.loaded_at if current else None,
+            "load_seconds": current.load_seconds if current else None,
+            "features": current.features if current else [],
+            "classes": [str(c) for c in current.encoder.classes_] if current else [],
+            "model_path": self.model_path,
+            "reloads": self.reloads,
+            "reload_interval": self.reload_interval,
+            "last_error": self.last_error,
+            "pid": os.getpid()
+        }
@@ -73,6 +73,7 @@ def apply_schema():
         "COMMENT ON COLUMN task_participants.participant_type IS 'Type of participant (usually LOAN).';",
         "COMMENT ON COLUMN task_participants.participant_id IS 'ID of the participant (e.g., Loan ID).';",
         "COMMENT ON COLUMN task_participants.payment_amount IS 'Amount collected during this task detail.';",
+        "COMMENT ON COLUMN task_participants.task_date IS 'Start date of the parent task; the table is partitioned by month on it.';",
 
         # Agents
         "COMMENT ON TABLE agents IS 'Configuration for AI Agents in the system.';",
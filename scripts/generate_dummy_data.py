@@ -1,212 +1,339 @@
-import csv
-import random
 import os
-from datetime import datetime, timedelta
+import time
+import argparse
+import numpy as np
+import pandas as pd
 
 # Output directory
 OUTPUT_DIR = "HACKATHON_2025_DATA"
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
 
-# Constants
+# Defaults reproduce the original small dataset; scale them up with CLI flags
 NUM_CUSTOMERS = 50
-NUM_LOANS = 100
-NUM_BILLS = 300
+LOANS_PER_CUSTOMER = 2
+BILLS_PER_LOAN = 3
 NUM_TASKS = 50
-NUM_PARTICIPANTS = 50
+PARTICIPANTS_PER_TASK = 1
+NUM_AGENTS = 10
+NUM_WORKFLOWS = 20
+NUM_AGENT_TASKS = 100
+
+# Rows generated and written per chunk; memory stays constant regardless of scale
+CHUNK_SIZE = 500000
+
+# Repayment behaviour defaults
+LOAN_SKEW = 0.5             # Zipf exponent of loans per customer; 0 spreads loans uniformly
+LATE_RATE = 0.15            # Share of paid installments paid after bill_scheduled_date
+DEFAULT_RATE = 0.05         # Share of loans that stop paying partway through the schedule
+BILL_INTERVAL_DAYS = 7      # Days between consecutive installments of a loan
+REPAYMENT_MARKUP = 0.1      # Installments sum to principal * (1 + markup)
+
+# Per-loan latent risk ~ Beta(RISK_ALPHA, RISK_BETA); a long right tail of risky borrowers
+# drives late payments, longer delays, defaults and DPD together
+RISK_ALPHA = 0.5
+RISK_BETA = 4.5
+
+MARITAL_STATUSES = np.array(["Single", "Married", "Divorced"])
+PURPOSES = np.array(["Modal Usaha", "Renovasi Rumah", "Pendidikan", "Kesehatan"])
+TASK_TYPES = np.array(["COLLECTION", "SURVEY", "VERIFICATION"])
+STATUSES = np.array(["PENDING", "IN_PROGRESS", "COMPLETED"])
+AGENT_ROLES = np.array(["COLLECTION_AGENT", "VERIFICATION_AGENT", "SALES_AGENT", "SUPPORT_AGENT", "SUPERVISOR_AGENT"])
+AGENT_STATUSES = np.array(["ACTIVE", "IDLE", "BUSY"])
+AGENT_TASK_TYPES = np.array(["CALL_CUSTOMER", "VERIFY_DOCS", "SEND_WHATSAPP"])
+PRIORITIES = np.array(["HIGH", "MEDIUM", "LOW"])
+SECTORS = np.array(["Retail", "Food & Beverage", "Services", "Agriculture", "Manufacturing"])
+EXPERIENCE_LEVELS = np.array(["< 1 year", "1-3 years", "3-5 years", "5-10 years", "> 10 years"])
+LOCATION_TYPES = np.array(["Permanent Shop", "Mobile", "Home-based", "Online Store"])
 
 # Helper functions
-def random_date(start_year=1970, end_year=2000):
-    start = datetime(start_year, 1, 1)
-    end = datetime(end_year, 12, 31)
-    return start + timedelta(days=random.randint(0, (end - start).days))
-
-def random_future_date():
-    start = datetime.now()
-    end = start + timedelta(days=30)
-    return start + timedelta(days=random.randint(0, (end - start).days))
-
-def random_past_date():
-    end = datetime.now()
-    start = end - timedelta(days=30)
-    return start + timedelta(days=random.randint(0, (end - start).days))
-
-# 1. Generate Customers
-print("Generating Customers...")
-customers = []
-for i in range(NUM_CUSTOMERS):
-    customer_number = f"CUST-{i+1:05d}"
-    customers.append({
-        "customer_number": customer_number,
-        "date_of_birth": random_date().strftime("%Y-%m-%d"),
-        "marital_status": random.choice(["Single", "Married", "Divorced"]),
-        "religion": random.randint(1, 5),
-        "purpose": random.choice(["Modal Usaha", "Renovasi Rumah", "Pendidikan", "Kesehatan"])
-    })
-
-with open(os.path.join(OUTPUT_DIR, "dummy_customers.csv"), "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=customers[0].keys())
-    writer.writeheader()
-    writer.writerows(customers)
-
-# 2. Generate Loans
-print("Generating Loans...")
-loans = []
-for i in range(NUM_LOANS):
-    loan_id = f"LOAN-{i+1:05d}"
-    customer = random.choice(customers)
-    principal = random.randint(1000000, 10000000)
-    loans.append({
-        "loan_id": loan_id,
-        "customer_number": customer["customer_number"],
-        "principal_amount": principal,
-        "outstanding_amount": principal * random.uniform(0.1, 0.9),
-        "dpd": random.choice([0, 0, 0, 5, 10, 30])
-    })
-
-with open(os.path.join(OUTPUT_DIR, "dummy_loans.csv"), "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=loans[0].keys())
-    writer.writeheader()
-    writer.writerows(loans)
-
-# 3. Generate Bills
-print("Generating Bills...")
-bills = []
-for i in range(NUM_BILLS):
-    bill_id = f"BILL-{i+1:05d}"
-    loan = random.choice(loans)
-    amount = loan["principal_amount"] / 10
-    bills.append({
-        "bill_id": bill_id,
-        "loan_id": loan["loan_id"],
-        "bill_scheduled_date": random_future_date().strftime("%Y-%m-%d"),
-        "bill_paid_date": random_past_date().strftime("%Y-%m-%d") if random.random() > 0.5 else "",
-        "amount": amount,
-        "paid_amount": amount if random.random() > 0.5 else 0
-    })
-
-with open(os.path.join(OUTPUT_DIR, "dummy_bills.csv"), "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=bills[0].keys())
-    writer.writeheader()
-    writer.writerows(bills)
-
-# 4. Generate Tasks
-print("Generating Tasks...")
-tasks = []
-for i in range(NUM_TASKS):
-    task_id = f"TASK-{i+1:05d}"
-    tasks.append({
-        "task_id": task_id,
-        "task_type": random.choice(["COLLECTION", "SURVEY", "VERIFICATION"]),
-        "task_status": random.choice(["PENDING", "IN_PROGRESS", "COMPLETED"]),
-        "start_datetime": random_past_date().isoformat(),
-        "end_datetime": random_future_date().isoformat(),
-        "actual_datetime": random_past_date().isoformat(),
-        "latitude": -6.2 + random.uniform(-0.1, 0.1),
-        "longitude": 106.8 + random.uniform(-0.1, 0.1),
-        "branch_id": f"BRANCH-{random.randint(1, 5):03d}"
-    })
-
-with open(os.path.join(OUTPUT_DIR, "dummy_tasks.csv"), "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=tasks[0].keys())
-    writer.writeheader()
-    writer.writerows(tasks)
-
-# 5. Generate Task Participants
-print("Generating Task Participants...")
-participants = []
-for i in range(NUM_PARTICIPANTS):
-    task = random.choice(tasks)
-    loan = random.choice(loans)
-    participants.append({
-        "task_id": task["task_id"],
-        "participant_type": "LOAN",
-        "participant_id": loan["loan_id"],
-        "is_face_matched": random.choice([True, False]),
-        "is_qr_matched": random.choice([True, False]),
-        "payment_amount": random.randint(50000, 500000)
-    })
-
-with open(os.path.join(OUTPUT_DIR, "dummy_task_participants.csv"), "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=participants[0].keys())
-    writer.writeheader()
-    writer.writerows(participants)
-
-# 6. Generate Agents
-print("Generating Agents...")
-agents = []
-roles = ["COLLECTION_AGENT", "VERIFICATION_AGENT", "SALES_AGENT", "SUPPORT_AGENT", "SUPERVISOR_AGENT"]
-for i in range(10):
-    agents.append({
-        "agent_id": i + 1,
-        "name": f"Agent-{i+1:03d}",
-        "role": random.choice(roles),
-        "status": random.choice(["ACTIVE", "IDLE", "BUSY"]),
+def make_ids(prefix, numbers, total):
+    """Format integer ids as zero-padded strings, e.g. CUST-00001."""
+    width = max(5, len(str(total)))
+    return pd.Series(np.char.add(prefix, np.char.zfill(np.asarray(numbers).astype(str), width)))
+
+def chunk_ranges(total, size):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+def random_dates(rng, n, start, end):
+    """Uniform dates between start and end (inclusive) as datetime64[D]."""
+    start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+    return start + rng.integers(0, (end - start).astype(int) + 1, n).astype("timedelta64[D]")
+
+def random_future_dates(rng, n, today, days=30):
+    return today + rng.integers(0, days + 1, n).astype("timedelta64[D]")
+
+def random_past_dates(rng, n, today, days=30):
+    return today - rng.integers(0, days + 1, n).astype("timedelta64[D]")
+
+def random_past_datetimes(rng, n, now, days=30):
+    return now - rng.integers(0, days * 86400 + 1, n).astype("timedelta64[s]")
+
+def random_future_datetimes(rng, n, now, days=30):
+    return now + rng.integers(0, days * 86400 + 1, n).astype("timedelta64[s]")
+
+def format_dates(values):
+    return pd.Series(values).dt.strftime("%Y-%m-%d")
+
+def format_datetimes(values):
+    return pd.Series(values).dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+class ChunkWriter:
+    """Append DataFrame chunks to a CSV file, writing the header once."""
+
+    def __init__(self, output_dir, filename):
+        self.path = os.path.join(output_dir, filename)
+        self.rows = 0
+
+    def write(self, df):
+        df.to_csv(self.path, mode="w" if self.rows == 0 else "a", header=self.rows == 0, index=False)
+        self.rows += len(df)
+
+# 1. Generate Customers (and their MSME profiles, one per customer)
+def generate_customers(rng, output_dir, num_customers, chunk_size):
+    customers = ChunkWriter(output_dir, "dummy_customers.csv")
+    profiles = ChunkWriter(output_dir, "dummy_msme_profiles.csv")
+    for start, end in chunk_ranges(num_customers, chunk_size):
+        n = end - start
+        customer_numbers = make_ids("CUST-", np.arange(start + 1, end + 1), num_customers)
+        customers.write(pd.DataFrame({
+            "customer_number": customer_numbers,
+            "date_of_birth": format_dates(random_dates(rng, n, "1970-01-01", "2000-12-31")),
+            "marital_status": rng.choice(MARITAL_STATUSES, n),
+            "religion": rng.integers(1, 6, n),
+            "purpose": rng.choice(PURPOSES, n)
+        }))
+        profiles.write(pd.DataFrame({
+            "customer_number": customer_numbers,
+            "business_name": "UD " + customer_numbers + " Jaya",
+            "business_sector": rng.choice(SECTORS, n),
+            "industry_experience": rng.choice(EXPERIENCE_LEVELS, n),
+            "annual_turnover": rng.integers(10000000, 500000001, n),
+            "number_of_employees": rng.integers(1, 21, n),
+            "location_type": rng.choice(LOCATION_TYPES, n)
+        }))
+    return customers.rows, profiles.rows
+
+def loan_counts(rng, num_customers, num_loans, skew):
+    """
+    Number of loans held by each customer.
+
+    Customers get Zipf rank-size weights (rank k holds a share proportional to
+    k ** -skew) in random order, so a few customers own hundreds of loans while
+    most own one or two. skew=0 gives a uniform spread.
+    """
+    weights = np.arange(1, num_customers + 1, dtype=float) ** -skew
+    rng.shuffle(weights)
+    return rng.multinomial(num_loans, weights / weights.sum())
+
+def simulate_repayments(rng, n, bills_per_loan, amount, today, late_rate, default_rate, interval_days):
+    """
+    Simulate time-ordered installments for n loans, returned as (n, bills_per_loan) arrays.
+
+    Each loan draws a latent risk that scales its probability of paying late, the
+    length of the delay and its probability of defaulting. A defaulting loan stops
+    paying from a random installment onward. Installments that are not yet due, or
+    whose payment would fall after today, are unpaid.
+    """
+    mean_risk = RISK_ALPHA / (RISK_ALPHA + RISK_BETA)
+    risk = rng.beta(RISK_ALPHA, RISK_BETA, n)
+    p_late = np.clip(late_rate * risk / mean_risk, 0, 1)[:, None]
+    p_default = np.clip(default_rate * risk / mean_risk, 0, 1)
+    shape = (n, bills_per_loan)
+
+    # Schedules start somewhere in the past so the dataset mixes finished and running loans
+    span = bills_per_loan * interval_days
+    disbursed = today - rng.integers(0, span + 90, n).astype("timedelta64[D]")
+    scheduled = disbursed[:, None] + (np.arange(1, bills_per_loan + 1) * interval_days).astype("timedelta64[D]")
+
+    default_at = np.where(rng.random(n) < p_default, rng.integers(0, bills_per_loan, n), bills_per_loan)
+    stopped = np.arange(bills_per_loan)[None, :] >= default_at[:, None]
+
+    late = rng.random(shape) < p_late
+    mean_delay = 1 + 30 * risk[:, None]
+    delay = np.where(late, rng.geometric(1 / np.broadcast_to(mean_delay, shape)), -rng.integers(0, 4, shape))
+    paid_date = scheduled + delay.astype("timedelta64[D]")
+
+    paid = ~stopped & (paid_date <= today)
+    paid_amount = np.where(paid, amount[:, None], 0.0)
+    return scheduled, paid_date, paid, paid_amount
+
+# 2. Generate Loans, and 3. their Bills, in the same chunk so bills can reuse loan amounts
+def generate_loans_and_bills(rng, output_dir, num_customers, num_loans, bills_per_loan, chunk_size, today,
+                             loan_skew=LOAN_SKEW, late_rate=LATE_RATE, default_rate=DEFAULT_RATE,
+                             interval_days=BILL_INTERVAL_DAYS):
+    loans = ChunkWriter(output_dir, "dummy_loans.csv")
+    bills = ChunkWriter(output_dir, "dummy_bills.csv")
+    num_bills = num_loans * bills_per_loan
+    loans_per_chunk = max(1, chunk_size // max(1, bills_per_loan))
+    # Loan j belongs to the customer whose cumulative count first exceeds j
+    cumulative = np.cumsum(loan_counts(rng, num_customers, num_loans, loan_skew))
+    for start, end in chunk_ranges(num_loans, loans_per_chunk):
+        n = end - start
+        loan_ids = make_ids("LOAN-", np.arange(start + 1, end + 1), num_loans)
+        customer_idx = np.searchsorted(cumulative, np.arange(start, end), side="right")
+        principal = rng.integers(1000000, 10000001, n)
+
+        if bills_per_loan == 0:
+            loans.write(pd.DataFrame({
+                "loan_id": loan_ids,
+                "customer_number": make_ids("CUST-", customer_idx + 1, num_customers),
+                "principal_amount": principal,
+                "outstanding_amount": principal.astype(float),
+                "dpd": 0
+            }))
+            continue
+
+        amount = np.round(principal * (1 + REPAYMENT_MARKUP) / bills_per_loan, 2)
+        scheduled, paid_date, paid, paid_amount = simulate_repayments(
+            rng, n, bills_per_loan, amount, today, late_rate, default_rate, interval_days)
+
+        # DPD counts from the oldest installment that is due and still unpaid
+        overdue = ~paid & (scheduled <= today)
+        oldest_overdue = np.where(overdue, scheduled, today).min(axis=1)
+        dpd = (today - oldest_overdue).astype(int)
+        outstanding = np.round(amount * bills_per_loan - paid_amount.sum(axis=1), 2)
+
+        loans.write(pd.DataFrame({
+            "loan_id": loan_ids,
+            "customer_number": make_ids("CUST-", customer_idx + 1, num_customers),
+            "principal_amount": principal,
+            "outstanding_amount": outstanding,
+            "dpd": dpd
+        }))
+
+        m = n * bills_per_loan
+        bills.write(pd.DataFrame({
+            "bill_id": make_ids("BILL-", np.arange(start * bills_per_loan + 1, start * bills_per_loan + m + 1), num_bills),
+            "loan_id": np.repeat(loan_ids.values, bills_per_loan),
+            "bill_scheduled_date": format_dates(scheduled.ravel()),
+            "bill_paid_date": format_dates(paid_date.ravel()).where(paid.ravel(), ""),
+            "amount": np.repeat(amount, bills_per_loan),
+            "paid_amount": paid_amount.ravel()
+        }))
+    return loans.rows, bills.rows
+
+# 4. Generate Tasks, and 5. their Participants
+def generate_tasks_and_participants(rng, output_dir, num_tasks, participants_per_task, num_loans, chunk_size, now):
+    tasks = ChunkWriter(output_dir, "dummy_tasks.csv")
+    participants = ChunkWriter(output_dir, "dummy_task_participants.csv")
+    num_participants = num_tasks * participants_per_task
+    for start, end in chunk_ranges(num_tasks, chunk_size):
+        n = end - start
+        tasks.write(pd.DataFrame({
+            "task_id": make_ids("TASK-", np.arange(start + 1, end + 1), num_tasks),
+            "task_type": rng.choice(TASK_TYPES, n),
+            "task_status": rng.choice(STATUSES, n),
+            "start_datetime": format_datetimes(random_past_datetimes(rng, n, now)),
+            "end_datetime": format_datetimes(random_future_datetimes(rng, n, now)),
+            "actual_datetime": format_datetimes(random_past_datetimes(rng, n, now)),
+            "latitude": np.round(-6.2 + rng.uniform(-0.1, 0.1, n), 8),
+            "longitude": np.round(106.8 + rng.uniform(-0.1, 0.1, n), 8),
+            "branch_id": "BRANCH-" + pd.Series(rng.integers(1, 6, n)).astype(str).str.zfill(3)
+        }))
+
+    for start, end in chunk_ranges(num_participants, chunk_size):
+        n = end - start
+        participants.write(pd.DataFrame({
+            "task_id": make_ids("TASK-", rng.integers(1, num_tasks + 1, n), num_tasks),
+            "participant_type": "LOAN",
+            "participant_id": make_ids("LOAN-", rng.integers(1, num_loans + 1, n), num_loans),
+            "is_face_matched": rng.random(n) > 0.5,
+            "is_qr_matched": rng.random(n) > 0.5,
+            "payment_amount": rng.integers(50000, 500001, n)
+        }))
+    return tasks.rows, participants.rows
+
+# 6. Generate Agents, 7. Workflows and 8. Agent Tasks
+def generate_agents(rng, output_dir, now):
+    agents = ChunkWriter(output_dir, "dummy_agents.csv")
+    agents.write(pd.DataFrame({
+        "agent_id": np.arange(1, NUM_AGENTS + 1),
+        "name": "Agent-" + pd.Series(np.arange(1, NUM_AGENTS + 1)).astype(str).str.zfill(3),
+        "role": rng.choice(AGENT_ROLES, NUM_AGENTS),
+        "status": rng.choice(AGENT_STATUSES, NUM_AGENTS),
         "capabilities": "nlp, decision_making, negotiation"
-    })
-
-with open(os.path.join(OUTPUT_DIR, "dummy_agents.csv"), "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=agents[0].keys())
-    writer.writeheader()
-    writer.writerows(agents)
-
-# 7. Generate Workflows
-print("Generating Workflows...")
-workflows = []
-for i in range(20):
-    workflows.append({
-        "workflow_id": f"WF-{i+1:03d}",
-        "name": f"Workflow {i+1}",
+    }))
+
+    workflows = ChunkWriter(output_dir, "dummy_workflows.csv")
+    workflow_ids = "WF-" + pd.Series(np.arange(1, NUM_WORKFLOWS + 1)).astype(str).str.zfill(3)
+    workflows.write(pd.DataFrame({
+        "workflow_id": workflow_ids,
+        "name": "Workflow " + pd.Series(np.arange(1, NUM_WORKFLOWS + 1)).astype(str),
         "description": "Automated process for loan recovery",
-        "status": random.choice(["ACTIVE", "PAUSED"])
-    })
-
-with open(os.path.join(OUTPUT_DIR, "dummy_workflows.csv"), "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=workflows[0].keys())
-    writer.writeheader()
-    writer.writerows(workflows)
-
-# 8. Generate Agent Tasks
-print("Generating Agent Tasks...")
-agent_tasks = []
-for i in range(100):
-    agent_tasks.append({
-        "agent_id": random.choice(agents)["agent_id"],
-        "workflow_id": random.choice(workflows)["workflow_id"],
-        "task_type": random.choice(["CALL_CUSTOMER", "VERIFY_DOCS", "SEND_WHATSAPP"]),
+        "status": rng.choice(np.array(["ACTIVE", "PAUSED"]), NUM_WORKFLOWS)
+    }))
+
+    agent_tasks = ChunkWriter(output_dir, "dummy_agent_tasks.csv")
+    n = NUM_AGENT_TASKS
+    agent_tasks.write(pd.DataFrame({
+        "agent_id": rng.integers(1, NUM_AGENTS + 1, n),
+        "workflow_id": rng.choice(workflow_ids.values, n),
+        "task_type": rng.choice(AGENT_TASK_TYPES, n),
         "description": "Perform assigned action",
-        "status": random.choice(["PENDING", "IN_PROGRESS", "COMPLETED"]),
-        "priority": random.choice(["HIGH", "MEDIUM", "LOW"]),
-        "assigned_at": random_past_date().isoformat(),
-        "completed_at": random_past_date().isoformat()
-    })
-
-with open(os.path.join(OUTPUT_DIR, "dummy_agent_tasks.csv"), "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=agent_tasks[0].keys())
-    writer.writeheader()
-    writer.writerows(agent_tasks)
-
-# 9. Generate MSME Profiles
-print("Generating MSME Profiles...")
-msme_profiles = []
-sectors = ["Retail", "Food & Beverage", "Services", "Agriculture", "Manufacturing"]
-experience_levels = ["< 1 year", "1-3 years", "3-5 years", "5-10 years", "> 10 years"]
-location_types = ["Permanent Shop", "Mobile", "Home-based", "Online Store"]
-
-for customer in customers:
-    msme_profiles.append({
-        "customer_number": customer["customer_number"],
-        "business_name": f"UD {customer['customer_number']} Jaya",
-        "business_sector": random.choice(sectors),
-        "industry_experience": random.choice(experience_levels),
-        "annual_turnover": random.randint(10000000, 500000000),
-        "number_of_employees": random.randint(1, 20),
-        "location_type": random.choice(location_types)
-    })
-
-with open(os.path.join(OUTPUT_DIR, "dummy_msme_profiles.csv"), "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=msme_profiles[0].keys())
-    writer.writeheader()
-    writer.writerows(msme_profiles)
-
-print("Dummy data generation complete.")
+        "status": rng.choice(STATUSES, n),
+        "priority": rng.choice(PRIORITIES, n),
+        "assigned_at": format_datetimes(random_past_datetimes(rng, n, now)),
+        "completed_at": format_datetimes(random_past_datetimes(rng, n, now))
+    }))
+    return agents.rows, workflows.rows, agent_tasks.rows
+
+def generate(output_dir=OUTPUT_DIR, customers=NUM_CUSTOMERS, loans_per_customer=LOANS_PER_CUSTOMER,
+             bills_per_loan=BILLS_PER_LOAN, tasks=NUM_TASKS, participants_per_task=PARTICIPANTS_PER_TASK,
+             chunk_size=CHUNK_SIZE, seed=None, loan_skew=LOAN_SKEW, late_rate=LATE_RATE,
+             default_rate=DEFAULT_RATE, interval_days=BILL_INTERVAL_DAYS):
+    """Generate all dummy CSVs with referential integrity (bills -> loans -> customers, participants -> tasks)."""
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    rng = np.random.default_rng(seed)
+    now = np.datetime64("now", "s")
+    today = now.astype("datetime64[D]")
+    num_loans = int(customers * loans_per_customer)
+    started = time.perf_counter()
+
+    print("Generating Customers and MSME Profiles...")
+    counts = dict(zip(["customers", "msme_profiles"], generate_customers(rng, output_dir, customers, chunk_size)))
+
+    print("Generating Loans and Bills...")
+    counts.update(zip(["loans", "bills"], generate_loans_and_bills(
+        rng, output_dir, customers, num_loans, bills_per_loan, chunk_size, today,
+        loan_skew, late_rate, default_rate, interval_days)))
+
+    print("Generating Tasks and Task Participants...")
+    counts.update(zip(["tasks", "task_participants"], generate_tasks_and_participants(
+        rng, output_dir, tasks, participants_per_task, num_loans, chunk_size, now)))
+
+    print("Generating Agents, Workflows and Agent Tasks...")
+    counts.update(zip(["agents", "workflows", "agent_tasks"], generate_agents(rng, output_dir, now)))
+
+    elapsed = time.perf_counter() - started
+    for table_name, rows in counts.items():
+        print(f"  {table_name:<20}{rows:>12}")
+    print(f"Dummy data generation complete ({sum(counts.values())} rows in {elapsed:.1f}s).")
+
+def scale(value):
+    """Accept counts such as 1e6 on the command line."""
+    return int(float(value))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate dummy CSVs for load and query testing.")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--customers", type=scale, default=NUM_CUSTOMERS)
+    parser.add_argument("--loans-per-customer", type=float, default=LOANS_PER_CUSTOMER)
+    parser.add_argument("--bills-per-loan", type=scale, default=BILLS_PER_LOAN)
+    parser.add_argument("--tasks", type=scale, default=NUM_TASKS)
+    parser.add_argument("--participants-per-task", type=scale, default=PARTICIPANTS_PER_TASK)
+    parser.add_argument("--chunk-size", type=scale, default=CHUNK_SIZE, help="Rows held in memory per chunk")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible datasets")
+    parser.add_argument("--loan-skew", type=float, default=LOAN_SKEW,
+                        help="Zipf exponent of loans per customer (0 = uniform)")
+    parser.add_argument("--late-rate", type=float, default=LATE_RATE,
+                        help="Share of paid installments paid after their scheduled date")
+    parser.add_argument("--default-rate", type=float, default=DEFAULT_RATE,
+                        help="Share of loans that stop paying partway through")
+    parser.add_argument("--bill-interval-days", type=int, default=BILL_INTERVAL_DAYS,
+                        help="Days between installments of a loan")
+    args = parser.parse_args()
+    generate(args.output_dir, args.customers, args.loans_per_customer, args.bills_per_loan,
+             args.tasks, args.participants_per_task, args.chunk_size, args.seed,
+             args.loan_skew, args.late_rate, args.default_rate, args.bill_interval_days)
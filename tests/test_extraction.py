@@ -0,0 +1,98 @@
+"""
+ExtractionService against an in-memory stand-in for the asyncpg pool; no Gemini
+or database needed.
+"""
+import asyncio
+import io
+import os
+import sys
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+import extraction  # noqa: E402
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetchval(self, query, *args):
+        if query == extraction.SELECT_EXACT:
+            row = self.rows.get(args[0])
+            return row and row["result"]
+        if query == extraction.SELECT_SIMILAR:
+            phash, _, _, max_distance, scope, _ = args
+            for row in self.rows.values():
+                if row["scope"] == scope and bin(row["phash"] ^ phash).count("1") <= max_distance:
+                    return row["result"]
+        return None
+
+    async def execute(self, query, *args):
+        if query == extraction.INSERT_RESULT:
+            content_hash, phash, _, result, scope = args
+            self.rows[content_hash] = {"phash": phash, "result": result, "scope": scope}
+
+class FakeDB:
+    def __init__(self):
+        self.rows = {}
+
+    @asynccontextmanager
+    async def connection(self):
+        yield FakeConnection(self.rows)
+
+class FakeKeyPool:
+    @asynccontextmanager
+    async def lease(self):
+        yield SimpleNamespace(key="test-api-key")
+
+def png_bytes(size=(32, 24)):
+    image = Image.new("RGB", size, (200, 120, 40))
+    image.paste((20, 20, 20), (0, 0, size[0] // 2, size[1]))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_cache_miss_is_stored_under_content_hash():
+    db = FakeDB()
+    calls = []
+
+    def fake_extract(data, mime_type, api_key):
+        calls.append(api_key)
+        return {"income": 1000}
+
+    data = png_bytes()
+    service = extraction.ExtractionService(db, FakeKeyPool(), extract=fake_extract)
+    assert asyncio.run(service.extract_image(data, "image/png")) == ({"income": 1000}, "gemini")
+    assert calls == ["test-api-key"]
+    assert list(db.rows) == [extraction.content_hash(data)]
+    assert db.rows[extraction.content_hash(data)]["scope"] is None
+
+    # A fresh worker (empty in-process LRU) finds it in the shared table
+    service = extraction.ExtractionService(db, FakeKeyPool(), extract=fake_extract)
+    assert asyncio.run(service.extract_image(data, "image/png")) == ({"income": 1000}, "exact")
+    assert len(calls) == 1
+
+def test_similar_images_are_reused_only_within_their_scope(monkeypatch):
+    monkeypatch.setattr(extraction, "PHASH_MAX_DISTANCE", 4)
+    db = FakeDB()
+    calls = []
+
+    def fake_extract(data, mime_type, api_key):
+        calls.append(data)
+        return {"income": len(calls)}
+
+    service = extraction.ExtractionService(db, FakeKeyPool(), extract=fake_extract)
+    original, resized = png_bytes(), png_bytes((64, 48))
+    asyncio.run(service.extract_image(original, "image/png", "chat-a"))
+
+    # Same dHash, other chat: extracted again, not answered with chat-a's amounts
+    assert asyncio.run(service.extract_image(resized, "image/png", "chat-b")) == ({"income": 2}, "gemini")
+    assert asyncio.run(service.extract_image(png_bytes((48, 36)), "image/png", "chat-a")) == ({"income": 1}, "similar")
+
+def test_similar_images_are_not_reused_by_default():
+    db = FakeDB()
+    service = extraction.ExtractionService(db, FakeKeyPool(), extract=lambda data, mime_type, api_key: {"n": len(data)})
+    asyncio.run(service.extract_image(png_bytes(), "image/png", "chat-a"))
+    assert asyncio.run(service.extract_image(png_bytes((64, 48)), "image/png", "chat-a"))[1] == "gemini"
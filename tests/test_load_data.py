@@ -0,0 +1,106 @@
+"""
+Loader tests against a real Postgres. Set TEST_DATABASE_URL to run them; each
+test builds schema.sql in a scratch schema and drops it afterwards.
+"""
+import os
+import sys
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+import load_data  # noqa: E402
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+@pytest.fixture
+def engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    schema = f"test_load_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(TEST_DATABASE_URL)
+    try:
+        with admin.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+    except Exception as e:
+        pytest.skip(f"cannot reach TEST_DATABASE_URL: {e}")
+
+    engine = create_engine(TEST_DATABASE_URL, connect_args={"options": f"-csearch_path={schema}"})
+    try:
+        raw = engine.raw_connection()
+        try:
+            with open(load_data.SCHEMA_PATH) as f:
+                raw.cursor().execute(f.read())
+            raw.commit()
+        finally:
+            raw.close()
+        load_data.ensure_watermark_table(engine)
+        load_data.ensure_checkpoint_table(engine)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO customers (customer_number) VALUES ('C1')"))
+            conn.execute(text("INSERT INTO loans (loan_id, customer_number) VALUES ('L1', 'C1')"))
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+def load_bills(engine, tmp_path, rows, upsert=False, retain_months=None):
+    path = tmp_path / "bills.csv"
+    path.write_text("bill_id,loan_id,bill_scheduled_date,bill_paid_date,amount,paid_amount\n"
+                    + "".join(f"{row}\n" for row in rows))
+    columns = load_data.parse_schema()["bills"]
+    return load_data.copy_table_chunked(engine, str(path), "bills", columns,
+                                        load_data.file_watermark(str(path)), upsert=upsert,
+                                        retain_months=retain_months)
+
+def stored_bills(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT bill_id, bill_scheduled_date::text, amount::int FROM bills ORDER BY 1, 2")).all()
+
+def test_full_load_keeps_first_bill_when_its_date_changes(engine, tmp_path):
+    load_bills(engine, tmp_path, ["B1,L1,2026-01-05,,10,"])
+    assert load_bills(engine, tmp_path, ["B1,L1,2026-02-05,,20,", "B2,L1,2026-02-05,,30,"]) == 1
+    assert stored_bills(engine) == [("B1", "2026-01-05", 10), ("B2", "2026-02-05", 30)]
+
+def test_upsert_moves_bill_to_its_new_month(engine, tmp_path):
+    load_bills(engine, tmp_path, ["B1,L1,2026-01-05,,10,", "B2,L1,2026-01-06,,30,"])
+    assert load_bills(engine, tmp_path, ["B1,L1,2026-02-05,,20,", "B2,L1,2026-01-06,,30,"], upsert=True) == 1
+    assert stored_bills(engine) == [("B1", "2026-02-05", 20), ("B2", "2026-01-06", 30)]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT total_bill::int FROM customer_features")).scalar() == 50
+
+def test_retention_skips_old_rows_without_creating_their_partitions(engine, tmp_path):
+    today = date.today().isoformat()
+    rows = ["B1,L1,2020-01-05,,10,", f"B2,L1,{today},,30,"]
+    for _ in range(2):
+        load_bills(engine, tmp_path, rows, retain_months=1)
+        load_data.detach_old_partitions(engine, ["bills"], 1)
+    assert stored_bills(engine) == [("B2", today, 30)]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT to_regclass('bills_p202001')")).scalar() is None
+
+def test_full_load_keeps_first_bill_across_chunks(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(load_data, "COPY_CHUNK_BYTES", 32)
+    assert load_bills(engine, tmp_path, ["B1,L1,2026-01-05,,10,", "B2,L1,2026-01-06,,30,",
+                                         "B1,L1,2026-02-05,,20,", "B1,L1,2026-03-05,,40,"]) == 2
+    assert stored_bills(engine) == [("B1", "2026-01-05", 10), ("B2", "2026-01-06", 30)]
+
+def test_incremental_refuses_table_without_key_unless_replacing(engine, tmp_path):
+    path = tmp_path / "task_participants.csv"
+    path.write_text("task_id,participant_type,participant_id\nT1,LOAN,L1\n")
+    columns = load_data.parse_schema()["task_participants"]
+
+    def load(**kwargs):
+        return load_data.copy_table_chunked(engine, str(path), "task_participants", columns,
+                                            load_data.file_watermark(str(path)), upsert=True, **kwargs)
+
+    with pytest.raises(Exception, match="--replace-unkeyed to truncate and reload task_participants"):
+        load()
+    assert load(replace_unkeyed=True) == 1
+    assert load(replace_unkeyed=True) == 1
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM task_participants")).scalar() == 1